@@ -0,0 +1,45 @@
+"""Document text_key / text_pages columns for the content store
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+Databases that already ran scripts/migrate_document_text.py (or were created
+by create_all after the columns were added) have them; they are skipped.
+Moving the inline text itself is still done by that script.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    sa.Column("text_key", sa.String(), nullable=True),
+    sa.Column("text_pages", sa.Integer(), nullable=True, server_default="0"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nothing to inspect when only emitting SQL (--sql)
+    existing = set() if op.get_context().as_sql else {
+        column["name"] for column in sa.inspect(op.get_bind()).get_columns("documents")
+    }
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column("documents", column)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("documents") as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
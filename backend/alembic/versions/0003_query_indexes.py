@@ -0,0 +1,47 @@
+"""Composite indexes for the per-user list and chat history queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+Each index leads with the filter columns and ends with the keyset page order
+(created_at, id), so a page is an index range read with no sort. Indexes that
+already exist under the same name are skipped: on a large Postgres table,
+create them first with CREATE INDEX CONCURRENTLY to avoid blocking writes.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_workflows_user_id_created_at", "workflows", ["user_id", "created_at", "id"]),
+    ("ix_documents_user_id_created_at", "documents", ["user_id", "created_at", "id"]),
+    ("ix_documents_text_key", "documents", ["text_key"]),
+    ("ix_chat_messages_workflow_id_user_id_created_at", "chat_messages",
+     ["workflow_id", "user_id", "created_at", "id"]),
+    ("ix_workflow_nodes_workflow_id", "workflow_nodes", ["workflow_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nothing to inspect when only emitting SQL (--sql)
+    inspector = None if op.get_context().as_sql else sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if inspector is None or name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
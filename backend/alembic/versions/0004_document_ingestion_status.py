@@ -0,0 +1,49 @@
+"""Document ingestion status / progress / error_message columns
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+Databases created by create_all after the columns were added already have
+them; they are skipped. Documents that existed before background ingestion were processed
+inline on upload, so they start out ready.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    sa.Column("status", sa.String(), nullable=True),
+    sa.Column("progress", sa.Float(), nullable=True),
+    sa.Column("error_message", sa.String(), nullable=True),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nothing to inspect when only emitting SQL (--sql)
+    existing = set() if op.get_context().as_sql else {
+        column["name"] for column in sa.inspect(op.get_bind()).get_columns("documents")
+    }
+    added = [column.name for column in COLUMNS if column.name not in existing]
+    for column in COLUMNS:
+        if column.name in added:
+            op.add_column("documents", column)
+    if "status" in added:
+        op.execute("UPDATE documents SET status = 'ready', progress = 1.0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("documents") as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
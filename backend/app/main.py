@@ -1,13 +1,24 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
 from dotenv import load_dotenv
 
 # Import routes
 from app.routes import auth, documents, workflows, chat
-from app.utils.database import init_db
+from app.utils.database import init_db, async_engine
+from app.services.ingestion_service import ingestion_queue
+from app.services.llm_service import llm_service, web_search_service
+from app.services.chat_session_service import chat_sessions
+from app.services.user_service import user_cache
+from app.services.llm_dispatcher import llm_dispatcher, LLMOverloadedError
+from app.utils.embeddings import embedding_service
+from app.utils.response_cache import response_cache
+from app.utils.text_store import text_store
+from app.utils.executors import executor_stats, shutdown_executors
 from app.middleware.error_handler import ErrorHandlerMiddleware, LoggingMiddleware
 
 load_dotenv()
@@ -16,14 +27,43 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load models and clients at startup instead of on the first request
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+
+def warm_up():
+    """Load the embedding model, vector store and LLM clients"""
+    for service in (embedding_service, llm_service):
+        try:
+            service.warm_up()
+        except Exception as e:
+            logger.error(f"Warm-up failed for {type(service).__name__}: {e}")
+    logger.info(f"Warm-up finished: {component_status()}")
+
+
+def component_status() -> dict:
+    """Which lazily loaded components are ready"""
+    return {**embedding_service.status(), **llm_service.status()}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize app on startup"""
     logger.info("Starting application...")
     init_db()
+    resumed = ingestion_queue.resume_pending()
+    if resumed:
+        logger.info(f"Re-queued {len(resumed)} unfinished document ingestion jobs")
+    if WARMUP_ON_STARTUP:
+        # Runs in the background so the server accepts traffic while models load
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
     yield
     logger.info("Shutting down application...")
+    ingestion_queue.shutdown(wait=False)
+    shutdown_executors(wait=False)
+    llm_dispatcher.executor.shutdown(wait=False)
+    await web_search_service.aclose()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -50,6 +90,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the browser read the pagination cursor on list endpoints
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -59,6 +101,16 @@ app.include_router(workflows.router)
 app.include_router(chat.router)
 
 
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request, exc: LLMOverloadedError):
+    """Shed load quickly when the LLM queue is full"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 @app.get("/", tags=["Health"])
 async def health_check():
     """Health check endpoint"""
@@ -75,6 +127,38 @@ async def api_health():
     return {"status": "ok"}
 
 
+@app.get("/api/ready", tags=["Health"])
+async def readiness():
+    """Readiness check reporting which components are loaded"""
+    components = component_status()
+    ready = all(components.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "loading", "components": components}
+    )
+
+
+
+@app.get("/api/metrics", tags=["Health"])
+async def metrics():
+    """Executor queue depths, embedding batcher counters and cache hit rates"""
+    return {
+        "executors": executor_stats(),
+        "ingestion_queue": {"pending": ingestion_queue.pending_count()},
+        "query_batcher": embedding_service.query_batcher.stats(),
+        "caches": {
+            **embedding_service.cache_stats(),
+            "responses": response_cache.stats(),
+            "users": user_cache.stats(),
+        },
+        "chat_sessions": chat_sessions.stats(),
+        "web_search": web_search_service.stats(),
+        "text_store": text_store.stats(),
+        "llm_dispatcher": llm_dispatcher.stats(),
+        "workflow_executions": workflows.execution_flights.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
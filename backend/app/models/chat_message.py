@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -8,6 +8,10 @@ from .base import Base
 class ChatMessage(Base):
     """ChatMessage model to store workflow execution chat history"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # A workflow's history for one user in page order
+        Index("ix_chat_messages_workflow_id_user_id_created_at", "workflow_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     workflow_id = Column(String, ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Float, Integer
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, DateTime, ForeignKey, Float, Integer, Index
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 from .base import Base
@@ -8,6 +8,12 @@ from .base import Base
 class Document(Base):
     """Document model to store uploaded documents and their embeddings"""
     __tablename__ = "documents"
+    __table_args__ = (
+        # A user's documents in list (keyset page) order
+        Index("ix_documents_user_id_created_at", "user_id", "created_at", "id"),
+        # Whether a stored text blob is still referenced when a document is deleted
+        Index("ix_documents_text_key", "text_key"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -15,9 +21,16 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)  # in bytes
     content_type = Column(String, default="application/pdf")
-    text_content = Column(String, nullable=True)  # Extracted text
+    # Extracted text lives in the content store (app/utils/text_store.py) under text_key
+    text_key = Column(String, nullable=True)
+    text_pages = Column(Integer, default=0)
+    # Legacy inline text, moved out by scripts/migrate_document_text.py; never loaded with the row
+    text_content = deferred(Column(String, nullable=True))
     embedding_id = Column(String, nullable=True)  # ChromaDB collection id
     chunks_count = Column(Integer, default=0)
+    status = Column(String, default="pending")  # pending, processing, ready, failed
+    progress = Column(Float, default=0.0)  # 0.0 - 1.0 while ingesting
+    error_message = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -8,6 +8,10 @@ from .base import Base
 class Workflow(Base):
     """Workflow model to store workflow definitions"""
     __tablename__ = "workflows"
+    __table_args__ = (
+        # A user's workflows in list (keyset page) order
+        Index("ix_workflows_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
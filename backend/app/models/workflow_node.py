@@ -10,7 +10,7 @@ class WorkflowNode(Base):
     __tablename__ = "workflow_nodes"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    workflow_id = Column(String, ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False)
+    workflow_id = Column(String, ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False, index=True)
     node_type = Column(String, nullable=False)  # user_query, knowledge_base, llm_engine, output
     node_id = Column(String, nullable=False)  # Unique within workflow (for React Flow)
     configuration = Column(JSON, nullable=True)  # Node-specific configuration
@@ -1,20 +1,26 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from app.utils.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.utils.database import get_async_db
 from app.utils.security import create_access_token, decode_token
 from app.schemas import UserRegister, UserLogin, TokenResponse, UserResponse
-from app.services.user_service import UserService
+from app.services.user_service import UserService, AuthenticatedUser, user_cache
 from datetime import timedelta
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 security = HTTPBearer()
+# For endpoints that also serve anonymous callers
+optional_security = HTTPBearer(auto_error=False)
+
+# Let read-only endpoints take the user from the signed token instead of looking it up
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() == "true"
 
 
 @router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
-    user = UserService.create_user(db, user_data)
+    user = await UserService.create_user_async(db, user_data)
     
     # Generate access token
     access_token = create_access_token(data={"sub": user.id, "email": user.email})
@@ -27,9 +33,9 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Authenticate user and return token"""
-    user = UserService.authenticate_user(db, user_data)
+    user = await UserService.authenticate_user_async(db, user_data)
     
     # Generate access token
     access_token = create_access_token(data={"sub": user.id, "email": user.email})
@@ -41,9 +47,54 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 
-async def get_current_user(credentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
     """Verify token and return current user"""
-    token = credentials.credentials
+    return await get_user_from_token(db, credentials.credentials)
+
+
+async def get_optional_user(credentials = Depends(optional_security), db: AsyncSession = Depends(get_async_db)):
+    """Current user when a bearer token is sent, otherwise None"""
+    if credentials is None:
+        return None
+    return await get_user_from_token(db, credentials.credentials)
+
+
+async def get_current_user_readonly(credentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    """Current user for read-only endpoints.
+    
+    With AUTH_TRUST_TOKEN_CLAIMS the signed token is trusted without a database
+    lookup until it expires; deactivations seen by this process still apply.
+    """
+    if not AUTH_TRUST_TOKEN_CLAIMS:
+        return await get_user_from_token(db, credentials.credentials)
+    
+    payload = _token_payload(credentials.credentials)
+    user = user_cache.get(payload["sub"])
+    if user is None:
+        if user_cache.is_deactivated(payload["sub"]):
+            raise _inactive_user()
+        user_cache.trusted_claims += 1
+        user = AuthenticatedUser(payload["sub"], payload.get("email"))
+    return user
+
+
+async def get_user_from_token(db: AsyncSession, token: str):
+    """Verify a bearer token and load its user (also used to authenticate WebSockets)
+    
+    Active users are cached by id for a short TTL, so most requests skip the query.
+    """
+    payload = _token_payload(token)
+    user = user_cache.get(payload["sub"])
+    if user is None:
+        user = await UserService.get_user_by_id_async(db, payload["sub"])
+        if not user.is_active:
+            raise _inactive_user()
+        user = user_cache.set(user)
+    return user
+
+
+def _token_payload(token: str) -> dict:
+    """Decoded claims of a valid token that names a user"""
     payload = decode_token(token)
     
     if payload is None:
@@ -53,15 +104,19 @@ async def get_current_user(credentials = Depends(security), db: Session = Depend
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    user_id = payload.get("sub")
-    if user_id is None:
+    if payload.get("sub") is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
-    
-    user = UserService.get_user_by_id(db, user_id)
-    return user
+    return payload
+
+
+def _inactive_user() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="User account is inactive"
+    )
 
 
 @router.get("/me", response_model=UserResponse)
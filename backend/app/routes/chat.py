@@ -1,20 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, status
 from pydantic import BaseModel
 from typing import List, Optional
-import google.generativeai as genai
-import os
 import logging
 from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.llm_service import llm_service
+from app.services.workflow_service import WorkflowService
+from app.services.chat_session_service import chat_sessions
+from app.services.llm_dispatcher import llm_dispatcher, LLMOverloadedError, INTERACTIVE
+from app.routes.auth import get_optional_user, get_user_from_token
+from app.utils.database import get_async_db, AsyncSessionLocal
+from app.utils.history import CHAT_HISTORY_TOKEN_BUDGET, window_history
+from app.utils.sse import sse_event, sse_response
+from app.utils.response_cache import response_cache, response_scope
 
 load_dotenv()
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Gemini is configured lazily by llm_service
+CHAT_MODEL = "gemini-2.5-flash-lite"
 
 # Models
 class Message(BaseModel):
@@ -29,6 +36,7 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     status: str = "success"
+    cache_status: Optional[str] = None
 
 # System prompt for the chat
 SYSTEM_PROMPT = """You are a helpful AI assistant for the GenAI Stack platform. 
@@ -45,75 +53,90 @@ When formatting responses:
 
 Be professional, helpful, and focused on workflow and AI topics."""
 
+async def _start_chat_session(request: ChatRequest, db: AsyncSession, user_id: Optional[str] = None):
+    """Validate the request and open a Gemini chat session seeded with its history.
+
+    A workflow's own history budget only applies for its signed-in owner.
+    """
+    if not llm_service.configured:
+        raise HTTPException(
+            status_code=500,
+            detail="GEMINI_API_KEY not configured"
+        )
+
+    if not request.message.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Message cannot be empty"
+        )
+
+    # Build conversation history for context
+    messages = []
+
+    # Add conversation history if provided
+    if request.conversationHistory:
+        for msg in request.conversationHistory:
+            messages.append({
+                "role": "user" if msg.role == "user" else "model",
+                "parts": [msg.content]
+            })
+
+    # Recent turns verbatim, older ones summarized, within the workflow's token budget
+    budget = CHAT_HISTORY_TOKEN_BUDGET
+    if request.workflowId and user_id:
+        budget = await WorkflowService.get_history_budget_async(db, request.workflowId, user_id) or budget
+    history = window_history(messages, budget)
+
+    # Reuse the pooled model client; the session itself only holds the history
+    model = llm_service.get_model(CHAT_MODEL, SYSTEM_PROMPT)
+    return model.start_chat(history=history)
+
+
+def _chat_scope(request: ChatRequest) -> tuple:
+    """Answers are only reused for the same conversation so far.
+
+    The scope is shared by every caller, so lookups are exact only (similarity=0):
+    a paraphrase match would hand one user the answer to another user's question.
+    """
+    history = [msg.model_dump() for msg in request.conversationHistory or []]
+    return response_scope("chat", [SYSTEM_PROMPT, history])
+
+
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_optional_user)
+):
     """
     Send a message to the GenAI Stack Chat and get a response
     Uses Gemini 2.5 Flash Lite model
     """
     try:
-        if not GEMINI_API_KEY:
-            raise HTTPException(
-                status_code=500,
-                detail="GEMINI_API_KEY not configured"
-            )
+        chat_session = await _start_chat_session(request, db, current_user.id if current_user else None)
 
-        if not request.message.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="Message cannot be empty"
-            )
+        scope = _chat_scope(request)
+        cached = await response_cache.lookup(scope, request.message, similarity=0)
+        if cached.hit:
+            return ChatResponse(response=cached.entry["response"], status="success", cache_status=cached.status)
 
-        # Build conversation history for context
-        messages = []
-        
-        # Add system prompt as first message
-        messages.append({
-            "role": "user",
-            "parts": [SYSTEM_PROMPT]
-        })
-        messages.append({
-            "role": "model",
-            "parts": ["I understand. I'm here to help with GenAI Stack workflows and related questions."]
-        })
-
-        # Add conversation history if provided
-        if request.conversationHistory:
-            for msg in request.conversationHistory:
-                messages.append({
-                    "role": "user" if msg.role == "user" else "model",
-                    "parts": [msg.content]
-                })
-
-        # Add current message
-        messages.append({
-            "role": "user",
-            "parts": [request.message]
-        })
-
-        # Initialize Gemini model
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash-lite",
-            system_instruction=SYSTEM_PROMPT
-        )
-
-        # Create chat session
-        chat_session = model.start_chat(history=messages[2:])  # Skip system messages
-
-        # Send message and get response
-        response = chat_session.send_message(request.message)
+        # Send message and get response (interactive calls are admitted ahead of batch work)
+        async with llm_dispatcher.slot(INTERACTIVE):
+            response = await llm_dispatcher.executor.run(chat_session.send_message, request.message)
         
         # Extract and format response text
         response_text = response.text if hasattr(response, 'text') else str(response)
+        response_cache.store(scope, request.message, response_text, cached)
 
         logger.info(f"Chat response generated for workflow {request.workflowId}")
 
         return ChatResponse(
             response=response_text,
-            status="success"
+            status="success",
+            cache_status=cached.status
         )
 
-    except HTTPException:
+    except (HTTPException, LLMOverloadedError):
         raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
@@ -122,11 +145,137 @@ async def chat(request: ChatRequest):
             detail=f"Error processing chat request: {str(e)}"
         )
 
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_optional_user)
+):
+    """
+    Stream the chat response over SSE: "token" events as text arrives,
+    then "done" with the full response (or "error")
+    """
+    chat_session = await _start_chat_session(request, db, current_user.id if current_user else None)
+
+    async def events():
+        parts = []
+        try:
+            scope = _chat_scope(request)
+            cached = await response_cache.lookup(scope, request.message, similarity=0)
+            if cached.hit:
+                yield sse_event("token", {"text": cached.entry["response"]})
+                yield sse_event("done", {"response": cached.entry["response"], "status": "success",
+                                         "cache_status": cached.status})
+                return
+            async with llm_dispatcher.slot(INTERACTIVE):
+                async for chunk in llm_dispatcher.executor.iterate(
+                    chat_session.send_message, request.message, stream=True
+                ):
+                    if chunk.text:
+                        parts.append(chunk.text)
+                        yield sse_event("token", {"text": chunk.text})
+            response_text = "".join(parts)
+            response_cache.store(scope, request.message, response_text, cached)
+            logger.info(f"Chat response streamed for workflow {request.workflowId}")
+            yield sse_event("done", {"response": response_text, "status": "success",
+                                     "cache_status": cached.status})
+        except LLMOverloadedError as e:
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield sse_event("error", {"detail": f"Error processing chat request: {str(e)}"})
+
+    return sse_response(events())
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    token: str,
+    workflow_id: Optional[str] = None,
+    session_id: Optional[str] = None
+):
+    """
+    Chat over one WebSocket with the conversation kept server-side.
+
+    Authenticates once with ?token=; pass ?session_id= to resume a session.
+    Client frames: {"type": "message", "content": ...} or {"type": "reset"}.
+    Server frames: "session" on connect, "token" chunks, then "done" (or "error").
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_from_token(db, token)
+            history_budget = (
+                await WorkflowService.get_history_budget_async(db, workflow_id, user.id) if workflow_id else None
+            )
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    if not llm_service.configured:
+        await websocket.send_json({"type": "error", "detail": "GEMINI_API_KEY not configured"})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
+
+    session = chat_sessions.get(session_id, user.id) if session_id else None
+    if session is None:
+        session = chat_sessions.create(user.id, CHAT_MODEL, SYSTEM_PROMPT, history_budget)
+    session.connections += 1
+    await websocket.send_json({"type": "session", "session_id": session.id, "turns": len(session.turns)})
+
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(websocket.receive_json(), chat_sessions.idle_timeout)
+            except asyncio.TimeoutError:
+                # Idle past the timeout: free the session and hang up
+                chat_sessions.close(session.id)
+                await websocket.close(code=status.WS_1000_NORMAL_CLOSURE, reason="Idle timeout")
+                return
+            except (ValueError, KeyError, TypeError):
+                # Not JSON, or a binary frame; the session stays open
+                frame = None
+            if not isinstance(frame, dict):
+                await websocket.send_json({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+
+            if frame.get("type") == "reset":
+                session.reset()
+                await websocket.send_json({"type": "done", "response": "", "status": "reset"})
+                continue
+
+            content = frame.get("content")
+            message = content.strip() if isinstance(content, str) else ""
+            if frame.get("type") != "message" or not message:
+                await websocket.send_json({"type": "error", "detail": "Expected a non-empty message"})
+                continue
+
+            async with session.lock:
+                parts = []
+                try:
+                    async for text in session.send(message):
+                        parts.append(text)
+                        await websocket.send_json({"type": "token", "text": text})
+                    await websocket.send_json({"type": "done", "response": "".join(parts), "status": "success"})
+                except WebSocketDisconnect:
+                    raise
+                except LLMOverloadedError as e:
+                    await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+                except Exception as e:
+                    logger.error(f"Error in chat websocket: {str(e)}")
+                    await websocket.send_json({"type": "error", "detail": f"Error processing chat request: {str(e)}"})
+            chat_sessions.evict()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.connections -= 1
+
+
 @router.get("/health")
 async def chat_health():
     """Health check for chat service"""
     return {
         "status": "healthy",
         "service": "Chat Service",
-        "gemini_configured": bool(GEMINI_API_KEY)
+        "gemini_configured": llm_service.configured
     }
@@ -1,23 +1,29 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.utils.database import get_db
-from app.utils.file_handler import extract_text_from_pdf, chunk_text, save_uploaded_file
-from app.utils.embeddings import embedding_service
-from app.schemas_workflow import DocumentResponse
+import os
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.utils.database import get_async_db
+from app.utils.file_handler import save_uploaded_file, count_pdf_pages_async, store_pdf_text_async
+from app.utils.embeddings import embedding_service, user_collection_name
+from app.utils.response_cache import response_cache
+from app.utils.pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT
+from app.utils.text_store import text_store
+from app.utils.executors import io_pool
+from app.schemas_workflow import DocumentResponse, DocumentTextResponse, IngestionJobResponse
 from app.services.workflow_service import DocumentService
-from app.routes.auth import get_current_user
+from app.services.ingestion_service import ingestion_queue
+from app.routes.auth import get_current_user, get_current_user_readonly
 
 router = APIRouter(prefix="/api/documents", tags=["Documents"])
 
 
-@router.post("/upload", response_model=DocumentResponse)
+@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_document(
     file: UploadFile = File(...),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Upload and process a document"""
+    """Upload a document and queue it for processing"""
     if not file.filename.endswith(".pdf"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -31,65 +37,160 @@ async def upload_document(
     # Save file
     file_path = save_uploaded_file(file.filename, content)
     
+    # Reject unreadable PDFs up front; parsing runs on the CPU executor
+    try:
+        await count_pdf_pages_async(file_path)
+    except Exception:
+        os.remove(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid PDF file"
+        )
+    
     # Create document record
-    document = DocumentService.create_document(
+    document = await DocumentService.create_document_async(
         db, current_user.id, file.filename, file_path, file_size
     )
     
-    # Extract text
-    text = extract_text_from_pdf(file_path)
-    document.text_content = text
+    # Extraction and embedding run in the ingestion worker pool
+    job = ingestion_queue.submit(document.id, file_path)
     
-    # Chunk text
-    chunks = chunk_text(text)
-    document.chunks_count = len(chunks)
-    
-    # Generate embeddings and store in ChromaDB
-    collection_name = f"doc_{document.id}"
-    success = embedding_service.add_documents(collection_name, chunks, document.id)
-    
-    if success:
-        document.embedding_id = collection_name
-    
-    db.commit()
-    db.refresh(document)
+    response = DocumentResponse.from_orm(document)
+    response.job_id = job.id
+    return response
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(
+    job_id: str,
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the status and progress of an ingestion job"""
+    job = ingestion_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
     
-    return DocumentResponse.from_orm(document)
+    document = await DocumentService.get_document_async(db, job.document_id, current_user.id)
+    return IngestionJobResponse(
+        job_id=job.id,
+        document_id=document.id,
+        status=document.status,
+        progress=document.progress or 0.0,
+        chunks_count=document.chunks_count or 0,
+        error_message=document.error_message,
+        submitted_at=job.submitted_at,
+        finished_at=job.finished_at
+    )
 
 
 @router.get("/", response_model=List[DocumentResponse])
 async def list_documents(
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all documents for the user"""
-    documents = DocumentService.list_documents(db, current_user.id)
-    return [DocumentResponse.from_orm(doc) for doc in documents]
+    """List the user's documents a page at a time
+    
+    Pass the X-Next-Cursor response header back as ?cursor= for the next page.
+    """
+    page = await DocumentService.list_documents_async(db, current_user.id, cursor, limit)
+    page.set_header(response)
+    return [DocumentResponse.from_orm(doc) for doc in page.items]
 
 
 @router.get("/{doc_id}", response_model=DocumentResponse)
 async def get_document(
     doc_id: str,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific document"""
-    document = DocumentService.get_document(db, doc_id, current_user.id)
+    document = await DocumentService.get_document_async(db, doc_id, current_user.id)
     return DocumentResponse.from_orm(document)
 
 
+@router.get("/{doc_id}/text", response_model=DocumentTextResponse)
+async def get_document_text(
+    doc_id: str,
+    start_page: int = Query(0, ge=0),
+    end_page: Optional[int] = Query(None, ge=1),
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a document's extracted text, optionally only pages start_page..end_page-1"""
+    document = await DocumentService.get_document_async(db, doc_id, current_user.id)
+    
+    if document.text_key:
+        pages = await _read_stored_pages(document, start_page, end_page)
+        total_pages = document.text_pages or 0
+    else:
+        # Not migrated yet: the whole text is one page on the row
+        text = await DocumentService.get_inline_text_async(db, doc_id)
+        if text is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document text is not available"
+            )
+        pages = [text][start_page:end_page]
+        total_pages = 1
+    
+    return DocumentTextResponse(
+        document_id=document.id,
+        start_page=start_page,
+        total_pages=total_pages,
+        pages=pages
+    )
+
+
+async def _read_stored_pages(document, start_page: int, end_page: Optional[int]) -> List[str]:
+    """Read a page range of a document's stored text, rebuilding a missing blob from its PDF.
+    
+    Identical uploads share a blob, and deleting one of them can remove it just
+    as another finishes ingesting and starts referencing it.
+    """
+    try:
+        return await text_store.read_pages_async(document.text_key, start_page, end_page)
+    except FileNotFoundError:
+        pass
+    
+    # Text is stored under the hash of its pages, so re-extracting the PDF restores the same key
+    if os.path.exists(document.file_path) and await store_pdf_text_async(document.file_path) == document.text_key:
+        return await text_store.read_pages_async(document.text_key, start_page, end_page)
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Document text is not available"
+    )
+
+
 @router.delete("/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_document(
     doc_id: str,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a document"""
-    document = DocumentService.get_document(db, doc_id, current_user.id)
+    document = await DocumentService.get_document_async(db, doc_id, current_user.id)
+    
+    # Drop a queued ingestion job; a running one stops once the row is gone
+    ingestion_queue.cancel(doc_id)
+    await DocumentService.delete_document_async(db, doc_id, current_user.id)
     
-    # Delete embeddings
-    if document.embedding_id:
-        embedding_service.delete_collection(document.embedding_id)
+    # Delete embeddings after the row, so batches a running job stores later are removed by the job;
+    # embedding_id is only set once ingestion finishes
+    await io_pool.run(
+        embedding_service.delete_document,
+        document.embedding_id or user_collection_name(current_user.id),
+        document.id
+    )
     
-    DocumentService.delete_document(db, doc_id, current_user.id)
+    if document.text_key and not await DocumentService.text_in_use_async(db, document.text_key):
+        await io_pool.run(text_store.delete, document.text_key)
+    # Cached answers may quote the deleted document
+    response_cache.invalidate_document(doc_id)
     return None
@@ -1,51 +1,170 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.utils.database import get_db
+import os
+import json
+import uuid
+import asyncio
+import logging
+import time
+import anyio
+from datetime import datetime
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from app.utils.database import get_async_db, AsyncSessionLocal
+from app.utils.sse import sse_event, sse_response
+from app.utils.pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT
 from app.schemas_workflow import (
     WorkflowCreate,
     WorkflowUpdate,
     WorkflowResponse,
+    WorkflowSummaryResponse,
     WorkflowExecutionRequest,
+    WorkflowBatchRequest,
     ChatMessageResponse
 )
 from app.services.workflow_service import WorkflowService, ChatService, DocumentService
-from app.services.llm_service import llm_service, web_search_service
+from app.services.workflow_engine import WorkflowGraph, EventHandler, workflow_engine
+from app.utils.response_cache import response_cache, response_scope
+from app.utils.singleflight import SingleFlight
 from app.utils.embeddings import embedding_service
-from app.routes.auth import get_current_user
+from app.services.llm_dispatcher import LLMOverloadedError, llm_priority, BATCH
+from app.routes.auth import get_current_user, get_current_user_readonly
 
 router = APIRouter(prefix="/api/workflows", tags=["Workflows"])
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "5000"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_INSERT_SIZE = int(os.getenv("BATCH_INSERT_SIZE", "100"))
+BATCH_OVERLOAD_RETRIES = 3
+
+# Identical executions in flight (same workflow configuration, documents and query) share one run
+execution_flights = SingleFlight()
+
+
+async def _resolve_targets(db: AsyncSession, document_ids: List[str], user_id: str) -> Dict[str, List[str]]:
+    """Group context documents by collection so each collection is searched once"""
+    targets = {}
+    if document_ids:
+        for document in await DocumentService.get_documents_async(db, document_ids, user_id):
+            if document.embedding_id:
+                targets.setdefault(document.embedding_id, []).append(document.id)
+    return targets
+
+
+async def _execute_cached(
+    workflow,
+    graph: WorkflowGraph,
+    request: WorkflowExecutionRequest,
+    targets: Dict[str, List[str]],
+    on_event: Optional[EventHandler] = None
+) -> Tuple[str, dict, str]:
+    """Answer from the response cache, or run the graph and cache a clean result.
+
+    A non-streaming caller whose execution is already in flight waits for
+    that run instead of starting its own, and gets cache status "coalesced".
+    Returns the response text, execution data and cache status.
+    """
+    scope = response_scope(workflow.id, workflow.configuration, request.context_documents)
+    similarity = _cache_similarity(workflow.configuration)
+    if on_event is not None:
+        return await _run_execution(scope, graph, request, targets, on_event, similarity)
+    
+    leader = False
+    
+    def start():
+        nonlocal leader
+        leader = True
+        return _run_execution(scope, graph, request, targets, similarity=similarity)
+    
+    response_text, execution_data, cache_status = await execution_flights.do(
+        response_cache.key(scope, request.query), start
+    )
+    if leader:
+        return response_text, execution_data, cache_status
+    return response_text, {**execution_data, "cache": {"status": "coalesced", "leader": cache_status}}, "coalesced"
+
+
+def _cache_similarity(configuration: Optional[dict]) -> Optional[float]:
+    """Paraphrase matching threshold a workflow opts in to (response_cache_similarity), if any"""
+    similarity = (configuration or {}).get("response_cache_similarity")
+    return float(similarity) if similarity is not None else None
+
+
+async def _run_execution(
+    scope: tuple,
+    graph: WorkflowGraph,
+    request: WorkflowExecutionRequest,
+    targets: Dict[str, List[str]],
+    on_event: Optional[EventHandler] = None,
+    similarity: Optional[float] = None
+) -> Tuple[str, dict, str]:
+    started = time.perf_counter()
+    cached = await response_cache.lookup(scope, request.query, similarity)
+    if cached.hit:
+        execution_data = {
+            "engine": "cache",
+            "cache": {"status": cached.status, "similarity": cached.similarity},
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return cached.entry["response"], execution_data, cached.status
+    
+    result = await workflow_engine.execute(graph, request.query, targets, on_event)
+    execution_data = result["execution_data"]
+    execution_data["cache"] = {"status": cached.status}
+    # Answers from degraded runs (failed or timed-out stages, LLM errors) are not reused, nor are
+    # answers missing context documents that are still ingesting (embedding_id is set once ready),
+    # since the scope stays the same when they finish
+    clean = all(node["status"] == "completed" for node in execution_data["nodes"].values())
+    resolved = {doc_id for doc_ids in targets.values() for doc_id in doc_ids}
+    complete = set(request.context_documents or []) <= resolved
+    if clean and complete and result["response"] and not result["response"].startswith("Error:"):
+        response_cache.store(scope, request.query, result["response"], cached)
+    return result["response"], execution_data, cached.status
 
 
 @router.post("/", response_model=WorkflowResponse, status_code=status.HTTP_201_CREATED)
 async def create_workflow(
     workflow_data: WorkflowCreate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new workflow"""
-    workflow = WorkflowService.create_workflow(db, current_user.id, workflow_data)
+    workflow = await WorkflowService.create_workflow_async(db, current_user.id, workflow_data)
     return WorkflowResponse.from_orm(workflow)
 
 
-@router.get("/", response_model=List[WorkflowResponse])
+@router.get("/", response_model=List[Union[WorkflowSummaryResponse, WorkflowResponse]])
 async def list_workflows(
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    include_configuration: bool = False,
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all workflows for the user"""
-    workflows = WorkflowService.list_workflows(db, current_user.id)
-    return [WorkflowResponse.from_orm(w) for w in workflows]
+    """List the user's workflows a page at a time
+    
+    Pass the X-Next-Cursor response header back as ?cursor= for the next page.
+    Configuration and nodes are only included with ?include_configuration=true.
+    """
+    page = await WorkflowService.list_workflows_async(
+        db, current_user.id, cursor, limit, include_configuration
+    )
+    page.set_header(response)
+    schema = WorkflowResponse if include_configuration else WorkflowSummaryResponse
+    return [schema.from_orm(w) for w in page.items]
 
 
 @router.get("/{workflow_id}", response_model=WorkflowResponse)
 async def get_workflow(
     workflow_id: str,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific workflow"""
-    workflow = WorkflowService.get_workflow(db, workflow_id, current_user.id)
+    workflow = await WorkflowService.get_workflow_async(db, workflow_id, current_user.id)
     return WorkflowResponse.from_orm(workflow)
 
 
@@ -54,10 +173,11 @@ async def update_workflow(
     workflow_id: str,
     workflow_data: WorkflowUpdate,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a workflow"""
-    workflow = WorkflowService.update_workflow(db, workflow_id, current_user.id, workflow_data)
+    workflow = await WorkflowService.update_workflow_async(db, workflow_id, current_user.id, workflow_data)
+    response_cache.invalidate_workflow(workflow_id)
     return WorkflowResponse.from_orm(workflow)
 
 
@@ -65,10 +185,11 @@ async def update_workflow(
 async def delete_workflow(
     workflow_id: str,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a workflow"""
-    WorkflowService.delete_workflow(db, workflow_id, current_user.id)
+    await WorkflowService.delete_workflow_async(db, workflow_id, current_user.id)
+    response_cache.invalidate_workflow(workflow_id)
     return None
 
 
@@ -77,63 +198,291 @@ async def execute_workflow(
     workflow_id: str,
     request: WorkflowExecutionRequest,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Execute workflow with query"""
+    """Execute the workflow graph with a query"""
     # Verify workflow exists and belongs to user
-    workflow = WorkflowService.get_workflow(db, workflow_id, current_user.id)
+    workflow = await WorkflowService.get_workflow_async(db, workflow_id, current_user.id)
+    graph = WorkflowGraph.from_workflow(workflow)
+    targets = await _resolve_targets(db, request.context_documents, current_user.id)
     
-    # Extract context from documents if specified
-    context = ""
-    if request.context_documents:
-        for doc_id in request.context_documents:
-            document = DocumentService.get_document(db, doc_id, current_user.id)
-            if document.embedding_id:
-                retrieved_docs = embedding_service.query_collection(
-                    document.embedding_id,
-                    request.query,
-                    n_results=3
-                )
-                if retrieved_docs:
-                    context += "\n".join(retrieved_docs) + "\n"
-    
-    # Check if web search should be enabled
-    use_web_search = False
-    if workflow.configuration and workflow.configuration.get("enable_web_search"):
-        use_web_search = True
-    
-    # Generate response using LLM
-    response_text = llm_service.generate_response(
-        prompt=request.query,
-        context=context if context else None,
-        temperature=0.7
+    response_text, execution_data, cache_status = await _execute_cached(workflow, graph, request, targets)
+    
+    # Store chat message with per-node timings
+    message = await ChatService.create_chat_message_async(
+        db, workflow_id, current_user.id, request.query, response_text, execution_data
     )
     
-    # If web search is enabled, enhance response
-    if use_web_search:
-        web_results = web_search_service.search(request.query, num_results=3)
-        if web_results:
-            web_context = "\n".join([f"- {r['title']}: {r['snippet']}" for r in web_results])
-            enhanced_prompt = f"Based on these web search results:\n{web_context}\n\nProvide an updated response to: {request.query}"
-            response_text = llm_service.generate_response(enhanced_prompt)
-    
-    # Store chat message
-    message = ChatService.create_chat_message(
-        db, workflow_id, current_user.id, request.query, response_text
+    response = ChatMessageResponse.from_orm(message)
+    response.cache_status = cache_status
+    return response
+
+
+@router.post("/{workflow_id}/execute/stream")
+async def execute_workflow_stream(
+    workflow_id: str,
+    request: WorkflowExecutionRequest,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Execute the workflow graph, streaming stage and token events over SSE
+    
+    Emits "stage" when a node finishes, "token" for LLM output as it arrives,
+    then "done" with the stored chat message (or "error").
+    """
+    workflow = await WorkflowService.get_workflow_async(db, workflow_id, current_user.id)
+    graph = WorkflowGraph.from_workflow(workflow)
+    targets = await _resolve_targets(db, request.context_documents, current_user.id)
+    user_id = current_user.id
+    
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def on_event(event: str, data: dict):
+            await queue.put(sse_event(event, data))
+        
+        async def run():
+            try:
+                response_text, execution_data, cache_status = await _execute_cached(
+                    workflow, graph, request, targets, on_event
+                )
+                # The request session is closed once streaming starts, so persist with a fresh one
+                async with AsyncSessionLocal() as message_db:
+                    message = await ChatService.create_chat_message_async(
+                        message_db, workflow_id, user_id, request.query, response_text, execution_data
+                    )
+                payload = ChatMessageResponse.from_orm(message).model_dump()
+                payload["cache_status"] = cache_status
+                await queue.put(sse_event("done", payload))
+            except LLMOverloadedError as e:
+                await queue.put(sse_event("error", {"detail": str(e), "retry_after": e.retry_after}))
+            except Exception as e:
+                logger.error(f"Streaming execution of workflow {workflow_id} failed: {e}")
+                await queue.put(sse_event("error", {"detail": str(e)}))
+            finally:
+                await queue.put(None)
+        
+        task = asyncio.create_task(run())
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+        finally:
+            # Stop the pipeline if the client disconnects mid-stream
+            if not task.done():
+                task.cancel()
+    
+    return sse_response(events())
+
+
+def _parse_jsonl(content: bytes) -> List[WorkflowExecutionRequest]:
+    """One query per line: a JSON string or an object like the execute request body"""
+    items = []
+    for line_number, line in enumerate(content.decode("utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+            items.append(WorkflowExecutionRequest(query=value) if isinstance(value, str)
+                         else WorkflowExecutionRequest(**value))
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid query on line {line_number}: {e}"
+            )
+    return items
+
+
+async def _start_batch(
+    db: AsyncSession,
+    workflow_id: str,
+    user_id: str,
+    items: List[WorkflowExecutionRequest],
+    concurrency: Optional[int]
+) -> StreamingResponse:
+    """Validate a batch up front, then stream its results as NDJSON"""
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No queries in batch")
+    if len(items) > BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch exceeds {BATCH_MAX_QUERIES} queries"
+        )
+    workflow = await WorkflowService.get_workflow_async(db, workflow_id, user_id)
+    graph = WorkflowGraph.from_workflow(workflow)
+    # Each distinct document set is resolved (and ownership checked) once for the whole batch
+    targets_by_documents = {}
+    for item in items:
+        documents = tuple(sorted(set(item.context_documents or [])))
+        if documents not in targets_by_documents:
+            targets_by_documents[documents] = await _resolve_targets(db, list(documents), user_id)
+    concurrency = max(min(concurrency or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY), 1)
+    
+    return StreamingResponse(
+        _batch_results(workflow, graph, items, targets_by_documents, user_id, concurrency),
+        media_type="application/x-ndjson"
     )
+
+
+def _log_prewarm_failure(task: asyncio.Task):
+    """Retrieve the prewarm's exception; queries embed on their own if it failed"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Batch query embedding prewarm failed: {task.exception()}")
+
+
+async def _batch_results(
+    workflow,
+    graph: WorkflowGraph,
+    items: List[WorkflowExecutionRequest],
+    targets_by_documents: Dict[tuple, Dict[str, List[str]]],
+    user_id: str,
+    concurrency: int
+) -> AsyncIterator[str]:
+    """Run a batch with bounded concurrency, yielding one JSON line per query as it completes"""
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    # Embed the whole batch in large batches while the first executions are under way
+    prewarm = asyncio.create_task(embedding_service.embed_queries_async([item.query for item in items]))
+    prewarm.add_done_callback(_log_prewarm_failure)
+    
+    def message_row(item: WorkflowExecutionRequest, response_text: str, execution_data: dict) -> dict:
+        return {
+            "id": str(uuid.uuid4()),
+            "workflow_id": workflow.id,
+            "user_id": user_id,
+            "query": item.query,
+            "response": response_text,
+            "execution_data": execution_data,
+            "created_at": datetime.utcnow(),
+        }
     
-    return ChatMessageResponse.from_orm(message)
+    async def run(index: int, item: WorkflowExecutionRequest):
+        # Each task has its own context, so this only lowers the priority of this batch's LLM calls
+        llm_priority.set(BATCH)
+        async with semaphore:
+            targets = targets_by_documents[tuple(sorted(set(item.context_documents or [])))]
+            try:
+                for attempt in range(BATCH_OVERLOAD_RETRIES + 1):
+                    try:
+                        return index, item, await _execute_cached(workflow, graph, item, targets), None
+                    except LLMOverloadedError as e:
+                        # Batch work backs off instead of failing when the LLM queue is full
+                        if attempt == BATCH_OVERLOAD_RETRIES:
+                            raise
+                        await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.error(f"Batch query {index} on workflow {workflow.id} failed: {e}")
+                return index, item, None, str(e)
+    
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    rows, succeeded, reported = [], 0, set()
+    # The request session is closed once streaming starts, so inserts use their own
+    db = AsyncSessionLocal()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, item, result, error = await next_done
+            reported.add(index)
+            if error is not None:
+                yield json.dumps({"index": index, "query": item.query, "error": error}) + "\n"
+                continue
+            response_text, execution_data, cache_status = result
+            row = message_row(item, response_text, execution_data)
+            rows.append(row)
+            succeeded += 1
+            if len(rows) >= BATCH_INSERT_SIZE:
+                await ChatService.bulk_create_chat_messages_async(db, rows)
+                rows = []
+            yield json.dumps({
+                "index": index,
+                "message_id": row["id"],
+                "query": item.query,
+                "response": response_text,
+                "cache_status": cache_status,
+                "total_ms": execution_data.get("total_ms"),
+            }) + "\n"
+        await ChatService.bulk_create_chat_messages_async(db, rows)
+        rows = []
+        yield json.dumps({"summary": {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }}) + "\n"
+    finally:
+        # Client went away: stop outstanding work but keep the answers already produced,
+        # including ones finished but not yet streamed
+        for task in tasks + [prewarm]:
+            task.cancel()
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                index, item, result, error = task.result()
+                if index not in reported and error is None:
+                    rows.append(message_row(item, result[0], result[1]))
+        # A disconnect cancels the scope this generator runs in; without the shield the
+        # first await here would raise again and the rows and session would be dropped
+        with anyio.CancelScope(shield=True):
+            try:
+                if rows:
+                    await ChatService.bulk_create_chat_messages_async(db, rows)
+            finally:
+                await db.close()
+
+
+@router.post("/{workflow_id}/execute/batch")
+async def execute_workflow_batch(
+    workflow_id: str,
+    request: WorkflowBatchRequest,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Execute many queries, streaming one NDJSON line per result as each completes
+    
+    Result lines carry the query's index in the batch; a final summary line follows.
+    """
+    items = [
+        WorkflowExecutionRequest(query=item) if isinstance(item, str) else item
+        for item in request.queries
+    ]
+    for item in items:
+        if item.context_documents is None:
+            item.context_documents = request.context_documents
+    return await _start_batch(db, workflow_id, current_user.id, items, request.concurrency)
+
+
+@router.post("/{workflow_id}/execute/batch/upload")
+async def execute_workflow_batch_upload(
+    workflow_id: str,
+    file: UploadFile = File(...),
+    concurrency: Optional[int] = Form(None),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Execute the queries in an uploaded JSONL file, streaming results as NDJSON"""
+    items = _parse_jsonl(await file.read())
+    return await _start_batch(db, workflow_id, current_user.id, items, concurrency)
 
 
 @router.get("/{workflow_id}/chat-history", response_model=List[ChatMessageResponse])
 async def get_chat_history(
     workflow_id: str,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    include_execution_data: bool = False,
+    oldest_first: bool = False,
+    current_user = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get chat history for a workflow"""
+    """Get a workflow's chat history a page at a time, newest first
+    
+    Pass the X-Next-Cursor response header back as ?cursor= for the next (older) page.
+    Per-node execution data is only included with ?include_execution_data=true,
+    and ?oldest_first=true pages from the start of the conversation instead.
+    """
     # Verify workflow exists
-    WorkflowService.get_workflow(db, workflow_id, current_user.id)
+    await WorkflowService.get_workflow_async(db, workflow_id, current_user.id)
     
-    messages = ChatService.get_chat_history(db, workflow_id, current_user.id)
-    return [ChatMessageResponse.from_orm(msg) for msg in messages]
+    page = await ChatService.get_chat_history_async(
+        db, workflow_id, current_user.id, cursor, limit, include_execution_data, oldest_first
+    )
+    page.set_header(response)
+    return [ChatMessageResponse.from_orm(msg) for msg in page.items]
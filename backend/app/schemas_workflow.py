@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 
 
@@ -33,21 +33,24 @@ class WorkflowUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 
-class WorkflowResponse(BaseModel):
+class WorkflowSummaryResponse(BaseModel):
     id: str
     user_id: str
     name: str
     description: str
-    configuration: Optional[Dict[str, Any]]
     is_active: bool
     created_at: datetime
     updated_at: datetime
-    nodes: List[WorkflowNodeResponse] = []
 
     class Config:
         from_attributes = True
 
 
+class WorkflowResponse(WorkflowSummaryResponse):
+    configuration: Optional[Dict[str, Any]] = None
+    nodes: List[WorkflowNodeResponse] = []
+
+
 class DocumentCreate(BaseModel):
     filename: str
     file_size: int
@@ -61,6 +64,11 @@ class DocumentResponse(BaseModel):
     file_size: int
     content_type: str
     chunks_count: int
+    text_pages: Optional[int] = None
+    status: Optional[str] = None
+    progress: Optional[float] = None
+    error_message: Optional[str] = None
+    job_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -68,6 +76,24 @@ class DocumentResponse(BaseModel):
         from_attributes = True
 
 
+class DocumentTextResponse(BaseModel):
+    document_id: str
+    start_page: int
+    total_pages: int
+    pages: List[str]
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: str
+    document_id: str
+    status: str
+    progress: float
+    chunks_count: int
+    error_message: Optional[str] = None
+    submitted_at: datetime
+    finished_at: Optional[datetime] = None
+
+
 class ChatMessageCreate(BaseModel):
     query: str = Field(..., min_length=1)
 
@@ -78,7 +104,8 @@ class ChatMessageResponse(BaseModel):
     user_id: str
     query: str
     response: Optional[str]
-    execution_data: Optional[Dict[str, Any]]
+    execution_data: Optional[Dict[str, Any]] = None
+    cache_status: Optional[str] = None  # hit, semantic_hit, coalesced, miss or bypass on execution
     created_at: datetime
 
     class Config:
@@ -88,3 +115,10 @@ class ChatMessageResponse(BaseModel):
 class WorkflowExecutionRequest(BaseModel):
     query: str = Field(..., min_length=1)
     context_documents: Optional[List[str]] = None  # Document IDs to use as context
+
+
+class WorkflowBatchRequest(BaseModel):
+    # Plain query strings, or items with their own context documents
+    queries: List[Union[str, WorkflowExecutionRequest]] = Field(..., min_length=1)
+    context_documents: Optional[List[str]] = None  # Default for items that do not set their own
+    concurrency: Optional[int] = Field(None, ge=1)
@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional
+from dotenv import load_dotenv
+
+from app.services.llm_service import llm_service
+from app.services.llm_dispatcher import llm_dispatcher, INTERACTIVE
+from app.utils.history import CHAT_HISTORY_TOKEN_BUDGET, estimate_tokens, window_history
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHAT_SESSION_IDLE_TIMEOUT = float(os.getenv("CHAT_SESSION_IDLE_TIMEOUT", "900"))  # seconds
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "1000"))
+CHAT_SESSION_MAX_MEMORY_MB = float(os.getenv("CHAT_SESSION_MAX_MEMORY_MB", "64"))
+
+
+class ChatSession:
+    """Conversation state and Gemini chat session held server-side for one user"""
+
+    def __init__(self, user_id: str, model_name: str, system_prompt: str,
+                 history_budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self.history_budget = history_budget
+        self.turns: List[dict] = []
+        self.connections = 0
+        self.last_active = time.monotonic()
+        # One turn at a time per conversation
+        self.lock = asyncio.Lock()
+        self._chat = None
+
+    @property
+    def chat(self):
+        if self._chat is None:
+            model = llm_service.get_model(self.model_name, self.system_prompt)
+            self._chat = model.start_chat(history=list(self.turns))
+        return self._chat
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by the conversation text"""
+        return sum(len(part) for turn in self.turns for part in turn["parts"])
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def reset(self):
+        self.turns = []
+        self._chat = None
+
+    async def send(self, message: str) -> AsyncIterator[str]:
+        """Stream the reply to a message, then record the turn"""
+        parts = []
+        async with llm_dispatcher.slot(INTERACTIVE):
+            async for chunk in llm_dispatcher.executor.iterate(self.chat.send_message, message, stream=True):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+        self.turns.append({"role": "user", "parts": [message]})
+        self.turns.append({"role": "model", "parts": ["".join(parts)]})
+        self.touch()
+        self._trim()
+
+    def _trim(self):
+        """Keep the history within its token budget, restarting the Gemini session on the window"""
+        tokens = sum(estimate_tokens(part) for turn in self.turns for part in turn["parts"])
+        if tokens > self.history_budget:
+            self.turns = window_history(self.turns, self.history_budget)
+            self._chat = None
+
+
+class ChatSessionStore:
+    """In-memory chat sessions with idle eviction and caps on count and total size.
+
+    Sessions outlive their WebSocket so a client can reconnect and resume;
+    ones idle past idle_timeout are dropped, and when the caps are exceeded
+    the least recently active sessions without a live connection go first.
+    """
+
+    def __init__(self, idle_timeout: float = CHAT_SESSION_IDLE_TIMEOUT,
+                 max_sessions: int = CHAT_SESSION_MAX_SESSIONS,
+                 max_memory_mb: float = CHAT_SESSION_MAX_MEMORY_MB):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.evicted = 0
+
+    def create(self, user_id: str, model_name: str, system_prompt: str,
+               history_budget: Optional[int] = None) -> ChatSession:
+        session = ChatSession(user_id, model_name, system_prompt, history_budget or CHAT_HISTORY_TOKEN_BUDGET)
+        self._sessions[session.id] = session
+        self.evict()
+        return session
+
+    def get(self, session_id: str, user_id: str) -> Optional[ChatSession]:
+        """Return a live session owned by the user"""
+        session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id or self._expired(session):
+            return None
+        self._sessions.move_to_end(session_id)
+        session.touch()
+        return session
+
+    def close(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def _expired(self, session: ChatSession) -> bool:
+        return time.monotonic() - session.last_active > self.idle_timeout
+
+    def evict(self):
+        """Drop idle sessions, then the least recently used ones past the caps"""
+        for session_id, session in list(self._sessions.items()):
+            if self._expired(session):
+                self._drop(session_id)
+
+        total_bytes = sum(session.size_bytes() for session in self._sessions.values())
+        # Oldest activity first
+        for session_id, session in sorted(self._sessions.items(), key=lambda item: item[1].last_active):
+            if len(self._sessions) <= self.max_sessions and total_bytes <= self.max_bytes:
+                break
+            if session.connections:
+                continue
+            total_bytes -= session.size_bytes()
+            self._drop(session_id)
+
+    def _drop(self, session_id: str):
+        if self._sessions.pop(session_id, None) is not None:
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "connected": sum(1 for session in self._sessions.values() if session.connections),
+            "memory_bytes": sum(session.size_bytes() for session in self._sessions.values()),
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+        }
+
+
+chat_sessions = ChatSessionStore()
@@ -0,0 +1,81 @@
+"""Local stand-in for the google.generativeai module (LLM_PROVIDER=fake).
+
+Implements the slice of the SDK the app uses: configure, GenerativeModel
+(generate_content with or without stream, start_chat / send_message) and
+types.GenerationConfig. Replies echo the prompt after FAKE_LLM_LATENCY_MS,
+and more than FAKE_LLM_MAX_CONCURRENCY simultaneous calls fail the way a
+rate-limited provider does, so admission control can be exercised offline.
+"""
+import os
+import time
+import threading
+from types import SimpleNamespace
+from typing import List, Optional
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "200"))
+FAKE_LLM_MAX_CONCURRENCY = int(os.getenv("FAKE_LLM_MAX_CONCURRENCY", "8"))
+FAKE_LLM_STREAM_CHUNKS = 5
+
+_lock = threading.Lock()
+_active = 0
+stats = {"calls": 0, "rate_limited": 0, "max_active": 0}
+
+
+class ResourceExhausted(Exception):
+    """Mirrors the provider's 429 error"""
+
+
+def configure(**kwargs):
+    pass
+
+
+types = SimpleNamespace(GenerationConfig=lambda **kwargs: kwargs)
+
+
+def _call(prompt: str) -> str:
+    global _active
+    with _lock:
+        stats["calls"] += 1
+        if _active >= FAKE_LLM_MAX_CONCURRENCY:
+            stats["rate_limited"] += 1
+            raise ResourceExhausted("429 Resource has been exhausted (fake provider)")
+        _active += 1
+        stats["max_active"] = max(stats["max_active"], _active)
+    try:
+        time.sleep(FAKE_LLM_LATENCY_MS / 1000)
+        return f"[fake] {prompt[-200:]}"
+    finally:
+        with _lock:
+            _active -= 1
+
+
+def _chunks(text: str) -> List[SimpleNamespace]:
+    size = max(len(text) // FAKE_LLM_STREAM_CHUNKS, 1)
+    return [SimpleNamespace(text=text[i:i + size]) for i in range(0, len(text), size)]
+
+
+class ChatSession:
+    def __init__(self, model: "GenerativeModel", history: Optional[list] = None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, message: str, stream: bool = False, **kwargs):
+        response = self.model.generate_content(message, stream=stream)
+        text = "".join(chunk.text for chunk in response) if stream else response.text
+        self.history += [{"role": "user", "parts": [message]}, {"role": "model", "parts": [text]}]
+        return response
+
+
+class GenerativeModel:
+    def __init__(self, model_name: str = "fake", system_instruction: Optional[str] = None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt, generation_config=None, stream: bool = False, **kwargs):
+        text = _call(prompt if isinstance(prompt, str) else str(prompt))
+        if stream:
+            return _chunks(text)
+        return SimpleNamespace(text=text)
+
+    def start_chat(self, history: Optional[list] = None) -> ChatSession:
+        return ChatSession(self, history)
@@ -0,0 +1,270 @@
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from datetime import datetime
+from typing import Dict, Optional, List
+from dotenv import load_dotenv
+
+from app.models import Document
+from app.utils.database import SessionLocal
+from app.utils.file_handler import iter_pdf_pages, count_pdf_pages, batched
+from app.utils.chunking import ChunkStats, get_chunker, strip_repeated_lines
+from app.utils.embeddings import user_collection_name
+from app.utils.text_store import text_store
+from app.utils.response_cache import response_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_EXECUTOR = os.getenv("INGESTION_EXECUTOR", "thread")  # thread or process
+INGESTION_JOB_HISTORY = int(os.getenv("INGESTION_JOB_HISTORY", "1000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+
+def _update_document(document_id: str, **fields):
+    """Persist ingestion state on the document row"""
+    db = SessionLocal()
+    try:
+        db.query(Document).filter(Document.id == document_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+class DocumentDeleted(Exception):
+    """The document was deleted while it was being ingested"""
+
+
+def _get_owner_id(document_id: str) -> str:
+    """Look up the user that owns a document"""
+    db = SessionLocal()
+    try:
+        row = db.query(Document.user_id).filter(Document.id == document_id).first()
+    finally:
+        db.close()
+    if row is None:
+        raise DocumentDeleted(document_id)
+    return row.user_id
+
+
+def _claim_document(document_id: str) -> bool:
+    """Atomically move a pending document to processing; False if another worker took it"""
+    db = SessionLocal()
+    try:
+        claimed = db.query(Document).filter(
+            Document.id == document_id,
+            Document.status == "pending"
+        ).update({"status": "processing", "progress": 0.0, "error_message": None}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return claimed == 1
+
+
+def _ensure_exists(document_id: str):
+    """Stop ingesting a document whose row has been deleted"""
+    _get_owner_id(document_id)
+
+
+def process_document(document_id: str, file_path: str, embedder=None, chunking_strategy: Optional[str] = None) -> int:
+    """Extract, chunk and embed a document; returns the number of chunks stored.
+
+    Runs inside the ingestion pool, so it opens its own database session and
+    reports progress through the document row. The row is re-checked before
+    each batch is stored and at the end, so a document deleted mid-ingestion
+    stops and its chunks are removed instead of being orphaned.
+    """
+    if embedder is None:
+        from app.utils.embeddings import embedding_service
+        embedder = embedding_service
+
+    # Every worker process resumes pending documents on startup; only one may ingest each
+    if not _claim_document(document_id):
+        logger.info(f"Document {document_id} is deleted or already being ingested, skipped")
+        return 0
+    collection_name = text_writer = None
+    try:
+        total_pages = max(count_pdf_pages(file_path), 1)
+        collection_name = user_collection_name(_get_owner_id(document_id))
+        # Clear chunks left by an interrupted earlier attempt
+        embedder.delete_document(collection_name, document_id)
+        # Pages are compressed into the text store as they are read, not kept for the end
+        text_writer = text_store.writer()
+        pages_read = 0
+
+        def pages():
+            nonlocal pages_read
+            for page in iter_pdf_pages(file_path):
+                pages_read += 1
+                text_writer.add(page)
+                yield page
+
+        # Pages stream through boilerplate removal and the chunker, and are embedded batch by batch
+        stats = ChunkStats()
+        chunker = get_chunker(chunking_strategy)
+        chunks = chunker.iter_chunks(strip_repeated_lines(pages(), stats=stats), stats)
+        chunks_count = 0
+        for batch in batched(chunks, EMBEDDING_BATCH_SIZE):
+            _ensure_exists(document_id)
+            if not embedder.add_documents(collection_name, batch, document_id, start_index=chunks_count):
+                raise RuntimeError("Failed to store embeddings")
+            chunks_count += len(batch)
+            _update_document(
+                document_id,
+                chunks_count=chunks_count,
+                progress=round(0.95 * pages_read / total_pages, 3)
+            )
+
+        _ensure_exists(document_id)
+        _update_document(
+            document_id,
+            text_key=text_writer.commit(),
+            text_pages=text_writer.page_count,
+            chunks_count=chunks_count,
+            embedding_id=collection_name,
+            status="ready",
+            progress=1.0
+        )
+        logger.info(f"Ingested document {document_id}: {stats.to_dict()}")
+        return chunks_count
+    except DocumentDeleted:
+        # Remove anything stored after the delete route cleared the chunks
+        if collection_name is not None:
+            embedder.delete_document(collection_name, document_id)
+        logger.info(f"Document {document_id} was deleted during ingestion, stopped")
+        return 0
+    except Exception as e:
+        logger.error(f"Ingestion failed for document {document_id}: {e}")
+        _update_document(document_id, status="failed", error_message=str(e))
+        raise
+    finally:
+        if text_writer is not None:
+            text_writer.abort()
+
+
+class IngestionJob:
+    """In-memory record of a submitted ingestion job"""
+
+    def __init__(self, document_id: str):
+        self.id = str(uuid.uuid4())
+        self.document_id = document_id
+        self.submitted_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.future: Optional[Future] = None
+
+
+class IngestionQueue:
+    """Worker pool that runs document ingestion off the request path"""
+
+    def __init__(self, max_workers: int = INGESTION_WORKERS, executor: str = INGESTION_EXECUTOR, embedder=None):
+        self.max_workers = max_workers
+        self.executor_type = executor
+        self.embedder = embedder
+        self._executor = None
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.executor_type == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="ingestion"
+                    )
+            return self._executor
+
+    def submit(self, document_id: str, file_path: str) -> IngestionJob:
+        """Queue a document for ingestion and return its job"""
+        job = IngestionJob(document_id)
+        # A custom embedder cannot cross a process boundary, so only pass it to threads
+        embedder = self.embedder if self.executor_type != "process" else None
+        job.future = self._get_executor().submit(process_document, document_id, file_path, embedder)
+        job.future.add_done_callback(lambda _: self._finished(job))
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_finished()
+        return job
+
+    @staticmethod
+    def _finished(job: IngestionJob):
+        job.finished_at = datetime.utcnow()
+        # Runs in this process for either executor; answers cached before the document
+        # (re)ingested were built without its chunks
+        response_cache.invalidate_document(job.document_id)
+
+    def _prune_finished(self):
+        """Forget the oldest finished jobs once the history limit is reached"""
+        overflow = len(self._jobs) - INGESTION_JOB_HISTORY
+        if overflow <= 0:
+            return
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+        for job in finished[:overflow]:
+            del self._jobs[job.id]
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        """Get a job by ID"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, document_id: str) -> int:
+        """Cancel a document's queued jobs; returns how many were cancelled.
+
+        A job that is already running stops by itself once the document row is gone.
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.document_id == document_id]
+        return sum(job.future.cancel() for job in jobs)
+
+    def pending_count(self) -> int:
+        """Number of jobs that have not finished yet"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def resume_pending(self) -> List[IngestionJob]:
+        """Re-queue documents left pending or processing by a previous run.
+
+        Documents a crashed run left processing are put back to pending with a
+        conditional update, so when several workers start together only one
+        resets each; the job itself then claims the pending row.
+        """
+        db = SessionLocal()
+        try:
+            documents = db.query(Document.id, Document.file_path, Document.status, Document.updated_at).filter(
+                Document.status.in_(["pending", "processing"])
+            ).all()
+            resumed = []
+            for doc_id, file_path, doc_status, updated_at in documents:
+                if doc_status == "processing":
+                    reset = db.query(Document).filter(
+                        Document.id == doc_id,
+                        Document.status == "processing",
+                        Document.updated_at == updated_at
+                    ).update({"status": "pending"}, synchronize_session=False)
+                    db.commit()
+                    if not reset:
+                        continue
+                resumed.append((doc_id, file_path))
+        finally:
+            db.close()
+        return [self.submit(doc_id, file_path) for doc_id, file_path in resumed]
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+ingestion_queue = IngestionQueue()
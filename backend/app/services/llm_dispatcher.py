@@ -0,0 +1,208 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+from app.utils.executors import ExecutorPool
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "10"))  # 0 disables rate limiting
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_QUEUE_DEPTH = int(os.getenv("LLM_MAX_QUEUE_DEPTH", "100"))
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+STANDARD = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STANDARD: "standard", BATCH: "batch"}
+
+# Priority of LLM calls made from the current request or task
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=STANDARD)
+
+
+@contextmanager
+def priority(level: int):
+    """Run LLM calls in this block (and tasks created in it) at the given priority"""
+    token = llm_priority.set(level)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+class LLMOverloadedError(Exception):
+    """Raised instead of queueing when too many LLM calls are already waiting"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM provider is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def try_take(self) -> float:
+        """Take a token if one is available; otherwise return the seconds until one is"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LLMDispatcher:
+    """Admission control for LLM provider calls.
+
+    Calls wait in a priority queue (interactive before standard before
+    batch, FIFO within a class) and are started while fewer than
+    max_concurrency are running and the token bucket allows. A call that
+    would wait behind max_queue_depth others of its class or higher is
+    rejected at once with LLMOverloadedError carrying a Retry-After hint.
+
+    Admitted calls run on the dispatcher's own thread pool, one thread per
+    slot, so slow provider calls never hold the shared I/O pool that vector
+    search and text reads use.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, rate_per_sec: float = LLM_RATE_PER_SEC,
+                 burst: int = LLM_BURST, max_queue_depth: int = LLM_MAX_QUEUE_DEPTH):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.executor = ExecutorPool("llm", "thread", max(max_concurrency, 1))
+        self._queue: List[tuple] = []  # (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._waiting: Dict[int, int] = {level: 0 for level in PRIORITY_NAMES}
+        self._active = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        # Smoothed call duration, for Retry-After estimates
+        self._avg_duration = 1.0
+        self.admitted = {level: 0 for level in PRIORITY_NAMES}
+        self.rejected = {level: 0 for level in PRIORITY_NAMES}
+        self._queue_seconds = {level: 0.0 for level in PRIORITY_NAMES}
+        self._max_queue_seconds = {level: 0.0 for level in PRIORITY_NAMES}
+
+    def _ahead_of(self, level: int) -> int:
+        """Calls that would be served before a new call at this priority"""
+        return sum(count for waiting_level, count in self._waiting.items() if waiting_level <= level)
+
+    def retry_after(self, level: int) -> int:
+        ahead = self._ahead_of(level)
+        by_concurrency = ahead * self._avg_duration / max(self.max_concurrency, 1)
+        by_rate = ahead / self.bucket.rate if self.bucket.rate > 0 else 0
+        return max(math.ceil(max(by_concurrency, by_rate)), 1)
+
+    async def acquire(self, level: Optional[int] = None):
+        """Wait for a slot; release() must follow"""
+        level = llm_priority.get() if level is None else level
+        if self._ahead_of(level) >= self.max_queue_depth:
+            self.rejected[level] += 1
+            raise LLMOverloadedError(self.retry_after(level))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (level, next(self._sequence), future))
+        self._waiting[level] += 1
+        enqueued = time.monotonic()
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller went away: hand the slot on
+                self.release()
+            raise
+        finally:
+            self._waiting[level] -= 1
+        waited = time.monotonic() - enqueued
+        self.admitted[level] += 1
+        self._queue_seconds[level] += waited
+        self._max_queue_seconds[level] = max(self._max_queue_seconds[level], waited)
+
+    def release(self, duration: Optional[float] = None):
+        self._active -= 1
+        if duration is not None:
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._pump()
+
+    def _pump(self):
+        """Start queued calls while there are free slots and tokens"""
+        while self._queue and self._active < self.max_concurrency:
+            future = self._queue[0][2]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = self.bucket.try_take()
+            if wait > 0:
+                if self._wakeup is None:
+                    self._wakeup = asyncio.get_running_loop().call_later(wait, self._on_wakeup)
+                return
+            heapq.heappop(self._queue)
+            self._active += 1
+            future.set_result(None)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._pump()
+
+    @asynccontextmanager
+    async def slot(self, level: Optional[int] = None):
+        """Hold an LLM slot for the duration of the block (e.g. while streaming)"""
+        await self.acquire(level)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run a blocking provider call on the LLM executor once admitted"""
+        async with self.slot():
+            return await self.executor.run(fn, *args, **kwargs)
+
+    async def iterate(self, fn: Callable, *args, **kwargs):
+        """Consume a blocking streaming call on the LLM executor, holding a slot until it ends"""
+        async with self.slot():
+            async for item in self.executor.iterate(fn, *args, **kwargs):
+                yield item
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_sec": self.bucket.rate,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_call_s": round(self._avg_duration, 3),
+            "executor": self.executor.stats(),
+            "classes": {
+                name: {
+                    "waiting": self._waiting[level],
+                    "admitted": self.admitted[level],
+                    "rejected": self.rejected[level],
+                    "avg_queue_ms": round(self._queue_seconds[level] / self.admitted[level] * 1000, 1)
+                    if self.admitted[level] else 0.0,
+                    "max_queue_ms": round(self._max_queue_seconds[level] * 1000, 1),
+                }
+                for level, name in PRIORITY_NAMES.items()
+            },
+        }
+
+
+llm_dispatcher = LLMDispatcher()
@@ -1,60 +1,182 @@
 import os
-import google.generativeai as genai
-import requests
-from typing import Optional, List
+import threading
+import httpx
+from typing import Iterator, Optional, List
 from dotenv import load_dotenv
+from app.utils.cache import LRUCache
+from app.utils.singleflight import SingleFlight
+from app.services.llm_dispatcher import llm_dispatcher
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")  # gemini, or fake for offline runs
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com")  # point at a stub server offline
+SERPAPI_TIMEOUT = float(os.getenv("SERPAPI_TIMEOUT", "10"))
+SERPAPI_MAX_CONNECTIONS = int(os.getenv("SERPAPI_MAX_CONNECTIONS", "20"))
+SERPAPI_CACHE_TTL = float(os.getenv("SERPAPI_CACHE_TTL", "600"))
+SERPAPI_CACHE_SIZE = int(os.getenv("SERPAPI_CACHE_SIZE", "1000"))
+LLM_MODEL_POOL_SIZE = int(os.getenv("LLM_MODEL_POOL_SIZE", "32"))
 
 
 class LLMService:
     """Service for interacting with Gemini LLM"""
     
     def __init__(self):
-        if GEMINI_API_KEY:
-            genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel("gemini-pro")
+        # The Gemini SDK and model client are loaded on first use (or by warm_up)
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+        # GenerativeModel clients keyed by (model name, system prompt)
+        self._models = LRUCache(LLM_MODEL_POOL_SIZE)
+    
+    @property
+    def genai(self):
+        """The configured google.generativeai module"""
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    if LLM_PROVIDER == "fake":
+                        from app.services import fake_llm as genai
+                    else:
+                        import google.generativeai as genai
+                    if GEMINI_API_KEY:
+                        genai.configure(api_key=GEMINI_API_KEY)
+                    self._genai = genai
+        return self._genai
+    
+    @property
+    def model(self):
+        if self._model is None:
+            genai = self.genai
+            with self._lock:
+                if self._model is None:
+                    self._model = genai.GenerativeModel("gemini-pro")
+        return self._model
+    
+    @property
+    def configured(self) -> bool:
+        """Whether a provider is available (an API key, or the fake provider)"""
+        return bool(GEMINI_API_KEY) or LLM_PROVIDER == "fake"
+    
+    def get_model(self, model_name: str, system_instruction: Optional[str] = None):
+        """Shared model client for a (model name, system prompt) pair"""
+        return self._models.get_or_set(
+            (model_name, system_instruction),
+            lambda: self.genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+        )
+    
+    def warm_up(self):
+        """Load the Gemini SDK and model client ahead of the first request"""
+        self.model
+    
+    def status(self) -> dict:
+        """Report which components have been loaded"""
+        return {"llm": self._model is not None}
+    
+    @staticmethod
+    def _build_prompt(prompt: str, context: Optional[str] = None) -> str:
+        if context:
+            return f"Context:\n{context}\n\nQuery:\n{prompt}"
+        return prompt
+    
+    def _generation_config(self, temperature: float):
+        return self.genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=1000
+        )
     
     def generate_response(self, prompt: str, context: Optional[str] = None, temperature: float = 0.7) -> str:
         """Generate response from Gemini"""
         try:
-            full_prompt = prompt
-            if context:
-                full_prompt = f"Context:\n{context}\n\nQuery:\n{prompt}"
-            
             response = self.model.generate_content(
-                full_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=temperature,
-                    max_output_tokens=1000
-                )
+                self._build_prompt(prompt, context),
+                generation_config=self._generation_config(temperature)
             )
             return response.text
         except Exception as e:
             print(f"Error generating response: {e}")
             return f"Error: Unable to generate response - {str(e)}"
+    
+    def stream_response(self, prompt: str, context: Optional[str] = None, temperature: float = 0.7) -> Iterator[str]:
+        """Generate response from Gemini, yielding text as it arrives"""
+        try:
+            response = self.model.generate_content(
+                self._build_prompt(prompt, context),
+                generation_config=self._generation_config(temperature),
+                stream=True
+            )
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            yield f"Error: Unable to generate response - {str(e)}"
+
+
+    async def generate_response_async(self, prompt: str, context: Optional[str] = None,
+                                      temperature: float = 0.7) -> str:
+        """Generate a response through the LLM dispatcher's admission control"""
+        return await llm_dispatcher.run(self.generate_response, prompt, context, temperature)
+    
+    async def stream_response_async(self, prompt: str, context: Optional[str] = None,
+                                    temperature: float = 0.7):
+        """Stream a response through the LLM dispatcher, holding a slot until it ends"""
+        async for text in llm_dispatcher.iterate(self.stream_response, prompt, context, temperature):
+            yield text
 
 
 class WebSearchService:
-    """Service for web search using SerpAPI"""
+    """Service for web search using SerpAPI
     
-    @staticmethod
-    def search(query: str, num_results: int = 5) -> List[dict]:
+    Uses one pooled keep-alive async client, caches results by normalized
+    query for SERPAPI_CACHE_TTL seconds, and lets concurrent identical
+    searches share a single request.
+    """
+    
+    def __init__(self, base_url: str = SERPAPI_BASE_URL):
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache = LRUCache(SERPAPI_CACHE_SIZE, ttl=SERPAPI_CACHE_TTL)
+        self._inflight = SingleFlight()
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(SERPAPI_TIMEOUT, connect=min(SERPAPI_TIMEOUT, 3.0)),
+                limits=httpx.Limits(
+                    max_connections=SERPAPI_MAX_CONNECTIONS,
+                    max_keepalive_connections=SERPAPI_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+    
+    async def search(self, query: str, num_results: int = 5) -> List[dict]:
         """Search the web using SerpAPI"""
         if not SERPAPI_API_KEY:
             return []
         
+        key = (" ".join(query.lower().split()), num_results)
+        results = self._cache.get(key)
+        if results is None:
+            results = await self._inflight.do(key, lambda: self._fetch(query, num_results))
+            if results is not None:
+                self._cache.set(key, results)
+        return results or []
+    
+    async def _fetch(self, query: str, num_results: int) -> Optional[List[dict]]:
+        """One SerpAPI request; None on failure so errors are not cached"""
         try:
-            url = "https://serpapi.com/search"
             params = {
                 "q": query,
                 "api_key": SERPAPI_API_KEY,
                 "num": num_results
             }
-            response = requests.get(url, params=params)
+            response = await self.client.get("/search", params=params)
             response.raise_for_status()
             
             results = response.json().get("organic_results", [])
@@ -68,7 +190,16 @@ class WebSearchService:
             ]
         except Exception as e:
             print(f"Error searching web: {e}")
-            return []
+            return None
+    
+    async def aclose(self):
+        """Close the pooled connections"""
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+    
+    def stats(self) -> dict:
+        return {"cache": self._cache.stats(), "single_flight": self._inflight.stats()}
 
 
 llm_service = LLMService()
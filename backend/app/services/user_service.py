@@ -1,45 +1,118 @@
-from sqlalchemy.orm import Session
+import os
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
-from app.utils.security import hash_password, verify_password
+from app.utils.cache import LRUCache
+from app.utils.security import hash_password, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.schemas import UserRegister, UserLogin
 from fastapi import HTTPException, status
 
+load_dotenv()
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds; 0 disables
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+
+class AuthenticatedUser:
+    """The user fields requests rely on, detached from any session so it can be shared"""
+
+    def __init__(self, id: str, email: str, username: Optional[str] = None, is_active: bool = True,
+                 created_at: Optional[datetime] = None):
+        self.id = id
+        self.email = email
+        self.username = username
+        self.is_active = is_active
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(user.id, user.email, user.username, user.is_active, user.created_at)
+
+
+class UserCache:
+    """Short-TTL cache of active users by id, so authenticating a request skips the user query.
+
+    Entries are dropped as soon as a User row is updated or deleted through the
+    ORM in this process (see the mapper events below); other workers pick the
+    change up within the TTL. Deactivated ids are also remembered for the life
+    of a token, so requests that trust token claims can still refuse them.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_SIZE):
+        self.enabled = ttl > 0 and max_size > 0
+        self._users = LRUCache(max_size, ttl=ttl)
+        self._deactivated = LRUCache(max_size, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        self.trusted_claims = 0
+
+    def get(self, user_id: str) -> Optional[AuthenticatedUser]:
+        return self._users.get(user_id) if self.enabled else None
+
+    def set(self, user: User) -> AuthenticatedUser:
+        snapshot = AuthenticatedUser.from_user(user)
+        if self.enabled and user.is_active:
+            self._users.set(user.id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id: str, deactivated: bool = False):
+        self._users.pop(user_id)
+        if deactivated:
+            self._deactivated.set(user_id, True)
+        else:
+            self._deactivated.pop(user_id)
+
+    def is_deactivated(self, user_id: str) -> bool:
+        return self._deactivated.get(user_id, False)
+
+    def stats(self) -> dict:
+        return {**self._users.stats(), "enabled": self.enabled, "trusted_claims": self.trusted_claims}
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, user: User):
+    user_cache.invalidate(user.id, deactivated=not user.is_active)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, user: User):
+    user_cache.invalidate(user.id, deactivated=True)
+
 
 class UserService:
     """Service for user operations"""
     
     @staticmethod
-    def create_user(db: Session, user_data: UserRegister) -> User:
-        """Create a new user"""
-        # Check if user already exists
-        existing_user = db.query(User).filter(
+    async def create_user_async(db: AsyncSession, user_data: UserRegister) -> User:
+        """Create a new user without blocking the event loop"""
+        result = await db.execute(select(User.id).where(
             (User.email == user_data.email) | (User.username == user_data.username)
-        ).first()
+        ).limit(1))
         
-        if existing_user:
+        if result.first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email or username already exists"
             )
         
-        # Hash password
-        hashed_password = hash_password(user_data.password)
-        
-        # Create user
         user = User(
             email=user_data.email,
             username=user_data.username,
-            hashed_password=hashed_password
+            hashed_password=hash_password(user_data.password)
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
         return user
     
     @staticmethod
-    def authenticate_user(db: Session, user_data: UserLogin) -> User:
-        """Authenticate user and return user object"""
-        user = db.query(User).filter(User.email == user_data.email).first()
+    async def authenticate_user_async(db: AsyncSession, user_data: UserLogin) -> User:
+        """Authenticate user and return user object without blocking the event loop"""
+        result = await db.execute(select(User).where(User.email == user_data.email))
+        user = result.scalars().first()
         
         if not user or not verify_password(user_data.password, user.hashed_password):
             raise HTTPException(
@@ -56,9 +129,9 @@ class UserService:
         return user
     
     @staticmethod
-    def get_user_by_id(db: Session, user_id: str) -> User:
-        """Get user by ID"""
-        user = db.query(User).filter(User.id == user_id).first()
+    async def get_user_by_id_async(db: AsyncSession, user_id: str) -> User:
+        """Get user by ID without blocking the event loop"""
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
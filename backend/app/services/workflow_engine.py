@@ -0,0 +1,289 @@
+import os
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from app.services.llm_service import llm_service, web_search_service
+from app.services.llm_dispatcher import LLMOverloadedError
+from app.utils.embeddings import embedding_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Receives (event, data) as the graph runs: "token" for streamed LLM text, "stage" when a node finishes
+EventHandler = Callable[[str, dict], Awaitable[None]]
+
+WEB_SEARCH_RESULTS = 3
+# Seconds each context stage may take; a stage that overruns contributes nothing
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "5"))
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "4"))
+# Seconds from the start of an execution by which all context stages must finish
+CONTEXT_DEADLINE = float(os.getenv("CONTEXT_DEADLINE", "6"))
+
+
+class WorkflowGraph:
+    """Nodes and edges of a saved workflow, in topological order"""
+
+    def __init__(self, nodes: List[dict], edges: List[dict]):
+        self.nodes: Dict[str, dict] = {}
+        for node in nodes:
+            node_id = node.get("id")
+            if not node_id or node_id in self.nodes:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid or duplicate node id: {node_id!r}"
+                )
+            self.nodes[node_id] = {"id": node_id, "type": node.get("type"), "config": node.get("config") or {}}
+
+        self.parents: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for edge in edges:
+            source, target = edge.get("source"), edge.get("target")
+            if source not in self.nodes or target not in self.nodes:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Edge references unknown node: {source!r} -> {target!r}"
+                )
+            if source not in self.parents[target]:
+                self.parents[target].append(source)
+
+        self._expand_web_search()
+        self.order = self._topological_order()
+
+    def _expand_web_search(self):
+        """Give each LLM node with web search enabled its own search node,
+        so the search runs alongside retrieval instead of after it"""
+        for node_id, node in list(self.nodes.items()):
+            if node["type"] == "llm_engine" and node["config"].get("enable_web_search"):
+                search_id = f"{node_id}__web_search"
+                self.nodes[search_id] = {"id": search_id, "type": "web_search", "config": {}}
+                self.parents[search_id] = []
+                self.parents[node_id].append(search_id)
+
+    def _topological_order(self) -> List[str]:
+        """Kahn's algorithm; keeps the saved node order among ready nodes"""
+        remaining = {node_id: len(parents) for node_id, parents in self.parents.items()}
+        children: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for node_id, parents in self.parents.items():
+            for parent in parents:
+                children[parent].append(node_id)
+
+        ready = [node_id for node_id in self.nodes if remaining[node_id] == 0]
+        order = []
+        while ready:
+            node_id = ready.pop(0)
+            order.append(node_id)
+            for child in children[node_id]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+
+        if len(order) != len(self.nodes):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Workflow graph contains a cycle"
+            )
+        return order
+
+    @classmethod
+    def from_workflow(cls, workflow) -> "WorkflowGraph":
+        """Build the graph saved by the builder, or the default
+        query -> knowledge base -> LLM -> output chain for workflows without one"""
+        configuration = workflow.configuration or {}
+        nodes = configuration.get("nodes")
+        if not nodes and workflow.nodes:
+            nodes = [
+                {"id": node.node_id, "type": node.node_type, "config": node.configuration}
+                for node in workflow.nodes
+            ]
+        if nodes:
+            return cls(nodes, configuration.get("edges") or [])
+        return cls.default(bool(configuration.get("enable_web_search")))
+
+    @classmethod
+    def default(cls, enable_web_search: bool = False) -> "WorkflowGraph":
+        nodes = [
+            {"id": "user_query", "type": "user_query"},
+            {"id": "knowledge_base", "type": "knowledge_base"},
+            {"id": "llm_engine", "type": "llm_engine", "config": {"enable_web_search": enable_web_search}},
+            {"id": "output", "type": "output"},
+        ]
+        edges = [
+            {"source": "user_query", "target": "knowledge_base"},
+            {"source": "knowledge_base", "target": "llm_engine"},
+            {"source": "llm_engine", "target": "output"},
+        ]
+        return cls(nodes, edges)
+
+
+class WorkflowEngine:
+    """Runs a workflow graph, starting each node as soon as its inputs are ready.
+
+    Node outputs are dicts with any of: query, documents (retrieved chunks),
+    web_results and responses. A node's input is the merge of its parents'
+    outputs, so independent branches such as retrieval and web search overlap.
+    With an on_event handler, LLM nodes stream their tokens and each finished
+    node is reported as a stage event.
+
+    Retrieval and web search are context stages: each gets its own timeout
+    (overridable per node with config["timeout"]) capped by a deadline shared
+    across the execution, and one that runs out is recorded as timed_out
+    while the LLM answers with whatever context did arrive.
+    """
+
+    def __init__(
+        self,
+        retrieval_timeout: float = RETRIEVAL_TIMEOUT,
+        web_search_timeout: float = WEB_SEARCH_TIMEOUT,
+        context_deadline: float = CONTEXT_DEADLINE
+    ):
+        self.stage_timeouts = {"knowledge_base": retrieval_timeout, "web_search": web_search_timeout}
+        self.context_deadline = context_deadline
+
+    async def execute(
+        self,
+        graph: WorkflowGraph,
+        query: str,
+        targets: Optional[Dict[str, List[str]]] = None,
+        on_event: Optional[EventHandler] = None
+    ) -> dict:
+        """Execute the graph; returns the final response and per-node timings"""
+        started = time.perf_counter()
+        timings: Dict[str, dict] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_node(node_id: str) -> dict:
+            parent_outputs = await asyncio.gather(*(tasks[parent] for parent in graph.parents[node_id]))
+            inputs = self._merge([{"query": query}, *parent_outputs])
+            node = graph.nodes[node_id]
+            node_started = time.perf_counter()
+            timing = {"type": node["type"], "started_ms": round((node_started - started) * 1000, 1)}
+            timeout = self._timeout(node, node_started - started)
+            try:
+                output = await asyncio.wait_for(self._run(node, inputs, targets or {}, on_event), timeout)
+                timing["status"] = "completed"
+            except LLMOverloadedError:
+                # Admission control rejected the call: fail the execution rather than answer without the LLM
+                raise
+            except asyncio.TimeoutError:
+                logger.warning(f"Workflow node {node_id} ({node['type']}) timed out after {timeout:.2f}s")
+                output = {}
+                timing["status"] = "timed_out"
+            except Exception as e:
+                logger.error(f"Workflow node {node_id} ({node['type']}) failed: {e}")
+                output = {}
+                timing.update(status="failed", error=str(e))
+            timing["duration_ms"] = round((time.perf_counter() - node_started) * 1000, 1)
+            timings[node_id] = timing
+            if on_event:
+                await on_event("stage", {"node": node_id, **timing})
+            return output
+
+        for node_id in graph.order:
+            tasks[node_id] = asyncio.create_task(run_node(node_id))
+        try:
+            outputs = dict(zip(graph.order, await asyncio.gather(*tasks.values())))
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        return {
+            "response": self._final_response(graph, outputs),
+            "execution_data": {
+                "engine": "dag",
+                "order": graph.order,
+                "nodes": {node_id: timings[node_id] for node_id in graph.order},
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            },
+        }
+
+    @staticmethod
+    def _stage(node: dict) -> str:
+        """The node's type, treating a web knowledge base as a web search"""
+        if node["type"] == "knowledge_base" and node["config"].get("kbType") == "web":
+            return "web_search"
+        return node["type"]
+
+    def _timeout(self, node: dict, elapsed: float) -> Optional[float]:
+        """Seconds a context stage may run, or None for other nodes"""
+        stage_timeout = self.stage_timeouts.get(self._stage(node))
+        if stage_timeout is None:
+            return None
+        stage_timeout = float(node["config"].get("timeout", stage_timeout))
+        return max(min(stage_timeout, self.context_deadline - elapsed), 0)
+
+    async def _run(self, node: dict, inputs: dict, targets: Dict[str, List[str]],
+                   on_event: Optional[EventHandler] = None) -> dict:
+        node_type = self._stage(node)
+        if node_type == "user_query":
+            return {"query": inputs["query"]}
+        if node_type == "knowledge_base":
+            documents = await embedding_service.search_async(targets, inputs["query"]) if targets else []
+            return {"documents": documents}
+        if node_type == "web_search":
+            results = await web_search_service.search(inputs["query"], num_results=WEB_SEARCH_RESULTS)
+            return {"web_results": results}
+        if node_type == "llm_engine":
+            return {"responses": [await self._generate(node, inputs, on_event)]}
+        # output and unknown node types pass their inputs through
+        return inputs
+
+    async def _generate(self, node: dict, inputs: dict, on_event: Optional[EventHandler] = None) -> str:
+        """One LLM call over everything that reached the node"""
+        config = node["config"]
+        sections = []
+        if inputs.get("documents"):
+            sections.append("\n".join(inputs["documents"]))
+        if inputs.get("web_results"):
+            web_context = "\n".join(f"- {r['title']}: {r['snippet']}" for r in inputs["web_results"])
+            sections.append(f"Web search results:\n{web_context}")
+        if inputs.get("responses"):
+            sections.append("Previous responses:\n" + "\n\n".join(inputs["responses"]))
+
+        prompt = inputs["query"]
+        if config.get("prompt"):
+            prompt = f"{config['prompt']}\n\n{prompt}"
+        kwargs = {
+            "prompt": prompt,
+            "context": "\n\n".join(sections) if sections else None,
+            "temperature": float(config.get("temperature", 0.7)),
+        }
+        if on_event is None:
+            return await llm_service.generate_response_async(**kwargs)
+        
+        parts = []
+        async for text in llm_service.stream_response_async(**kwargs):
+            parts.append(text)
+            await on_event("token", {"node": node["id"], "text": text})
+        return "".join(parts)
+
+    @staticmethod
+    def _merge(outputs: List[dict]) -> dict:
+        merged: Dict[str, Any] = {"query": outputs[0]["query"], "documents": [], "web_results": [], "responses": []}
+        for output in outputs[1:]:
+            for key in ("documents", "web_results", "responses"):
+                merged[key].extend(output.get(key) or [])
+        return merged
+
+    @staticmethod
+    def _final_response(graph: WorkflowGraph, outputs: Dict[str, dict]) -> str:
+        """Responses reaching output nodes, else the last LLM response"""
+        responses = [
+            response
+            for node_id in graph.order if graph.nodes[node_id]["type"] == "output"
+            for response in outputs[node_id].get("responses", [])
+        ]
+        if not responses:
+            responses = [
+                outputs[node_id]["responses"][-1]
+                for node_id in graph.order
+                if graph.nodes[node_id]["type"] == "llm_engine" and outputs[node_id].get("responses")
+            ][-1:]
+        return "\n\n".join(responses)
+
+
+workflow_engine = WorkflowEngine()
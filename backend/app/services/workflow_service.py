@@ -1,17 +1,25 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.models import Workflow, WorkflowNode, Document, ChatMessage
 from app.schemas_workflow import WorkflowCreate, WorkflowUpdate, WorkflowExecutionRequest
+from app.utils.pagination import Page, keyset_page, to_page
 from fastapi import HTTPException, status
 from typing import Optional, List
 import json
 
 
+def _columns_except(model, *excluded: str) -> list:
+    """A model's columns without the heavy ones a response leaves out"""
+    return [column for column in model.__table__.columns if column.key not in excluded]
+
+
 class WorkflowService:
     """Service for workflow operations"""
     
     @staticmethod
-    def create_workflow(db: Session, user_id: str, workflow_data: WorkflowCreate) -> Workflow:
-        """Create a new workflow"""
+    async def create_workflow_async(db: AsyncSession, user_id: str, workflow_data: WorkflowCreate) -> Workflow:
+        """Create a new workflow without blocking the event loop"""
         workflow = Workflow(
             user_id=user_id,
             name=workflow_data.name,
@@ -19,17 +27,20 @@ class WorkflowService:
             configuration=workflow_data.configuration
         )
         db.add(workflow)
-        db.commit()
-        db.refresh(workflow)
+        await db.commit()
+        # Responses include the nodes, which can't be lazy loaded later
+        await db.refresh(workflow, ["nodes"])
         return workflow
     
     @staticmethod
-    def get_workflow(db: Session, workflow_id: str, user_id: str) -> Workflow:
-        """Get workflow by ID and verify ownership"""
-        workflow = db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.user_id == user_id
-        ).first()
+    async def get_workflow_async(db: AsyncSession, workflow_id: str, user_id: str) -> Workflow:
+        """Get workflow by ID, with its nodes, and verify ownership"""
+        result = await db.execute(
+            select(Workflow)
+            .options(selectinload(Workflow.nodes))
+            .where(Workflow.id == workflow_id, Workflow.user_id == user_id)
+        )
+        workflow = result.scalars().first()
         
         if not workflow:
             raise HTTPException(
@@ -39,29 +50,63 @@ class WorkflowService:
         return workflow
     
     @staticmethod
-    def list_workflows(db: Session, user_id: str) -> List[Workflow]:
-        """List all workflows for a user"""
-        return db.query(Workflow).filter(Workflow.user_id == user_id).all()
+    async def get_history_budget_async(db: AsyncSession, workflow_id: str, user_id: str) -> Optional[int]:
+        """Chat history token budget set on one of the user's workflows (top level or on its LLM node), if any"""
+        configuration = await db.scalar(
+            select(Workflow.configuration).where(Workflow.id == workflow_id, Workflow.user_id == user_id)
+        )
+        return WorkflowService._history_budget(configuration)
+    
+    @staticmethod
+    def _history_budget(configuration: Optional[dict]) -> Optional[int]:
+        configuration = configuration or {}
+        budget = configuration.get("history_token_budget")
+        for node in configuration.get("nodes") or []:
+            if budget is None and node.get("type") == "llm_engine":
+                budget = (node.get("config") or {}).get("history_token_budget")
+        return int(budget) if budget else None
     
     @staticmethod
-    def update_workflow(db: Session, workflow_id: str, user_id: str, workflow_data: WorkflowUpdate) -> Workflow:
-        """Update workflow"""
-        workflow = WorkflowService.get_workflow(db, workflow_id, user_id)
+    async def list_workflows_async(
+        db: AsyncSession,
+        user_id: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_configuration: bool = False
+    ) -> Page:
+        """One page of a user's workflows, oldest first.
+        
+        Without include_configuration only the summary columns are read and
+        the configuration and nodes are left out.
+        """
+        if include_configuration:
+            query = select(Workflow).options(selectinload(Workflow.nodes))
+        else:
+            query = select(*_columns_except(Workflow, "configuration"))
+        result = await db.execute(keyset_page(query.where(Workflow.user_id == user_id), Workflow, cursor, limit))
+        rows = result.scalars().all() if include_configuration else result.all()
+        return to_page(list(rows), limit)
+    
+    @staticmethod
+    async def update_workflow_async(
+        db: AsyncSession, workflow_id: str, user_id: str, workflow_data: WorkflowUpdate
+    ) -> Workflow:
+        """Update workflow without blocking the event loop"""
+        workflow = await WorkflowService.get_workflow_async(db, workflow_id, user_id)
         
         update_data = workflow_data.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(workflow, field, value)
         
-        db.commit()
-        db.refresh(workflow)
+        await db.commit()
         return workflow
     
     @staticmethod
-    def delete_workflow(db: Session, workflow_id: str, user_id: str) -> bool:
-        """Delete workflow"""
-        workflow = WorkflowService.get_workflow(db, workflow_id, user_id)
-        db.delete(workflow)
-        db.commit()
+    async def delete_workflow_async(db: AsyncSession, workflow_id: str, user_id: str) -> bool:
+        """Delete workflow without blocking the event loop"""
+        workflow = await WorkflowService.get_workflow_async(db, workflow_id, user_id)
+        await db.delete(workflow)
+        await db.commit()
         return True
 
 
@@ -69,8 +114,10 @@ class DocumentService:
     """Service for document operations"""
     
     @staticmethod
-    def create_document(db: Session, user_id: str, filename: str, file_path: str, file_size: int) -> Document:
-        """Create a new document"""
+    async def create_document_async(
+        db: AsyncSession, user_id: str, filename: str, file_path: str, file_size: int
+    ) -> Document:
+        """Create a new document without blocking the event loop"""
         document = Document(
             user_id=user_id,
             filename=filename,
@@ -78,17 +125,16 @@ class DocumentService:
             file_size=file_size
         )
         db.add(document)
-        db.commit()
-        db.refresh(document)
+        await db.commit()
+        # Pick up column defaults (status, progress, ...) for the response
+        await db.refresh(document)
         return document
     
     @staticmethod
-    def get_document(db: Session, doc_id: str, user_id: str) -> Document:
-        """Get document by ID and verify ownership"""
-        document = db.query(Document).filter(
-            Document.id == doc_id,
-            Document.user_id == user_id
-        ).first()
+    async def get_document_async(db: AsyncSession, doc_id: str, user_id: str) -> Document:
+        """Get document by ID and verify ownership without blocking the event loop"""
+        result = await db.execute(select(Document).where(Document.id == doc_id, Document.user_id == user_id))
+        document = result.scalars().first()
         
         if not document:
             raise HTTPException(
@@ -98,16 +144,43 @@ class DocumentService:
         return document
     
     @staticmethod
-    def list_documents(db: Session, user_id: str) -> List[Document]:
-        """List all documents for a user"""
-        return db.query(Document).filter(Document.user_id == user_id).all()
+    async def get_documents_async(db: AsyncSession, doc_ids: List[str], user_id: str) -> List[Document]:
+        """Get several documents in one query, verifying ownership, without blocking the event loop"""
+        result = await db.execute(select(Document).where(Document.id.in_(doc_ids), Document.user_id == user_id))
+        documents = list(result.scalars().all())
+        
+        if len(documents) != len(set(doc_ids)):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        return documents
+    
+    @staticmethod
+    async def list_documents_async(
+        db: AsyncSession, user_id: str, cursor: Optional[str] = None, limit: Optional[int] = None
+    ) -> Page:
+        """One page of a user's documents, oldest first, without the extracted text"""
+        query = select(*_columns_except(Document, "text_content")).where(Document.user_id == user_id)
+        result = await db.execute(keyset_page(query, Document, cursor, limit))
+        return to_page(list(result.all()), limit)
+    
+    @staticmethod
+    async def get_inline_text_async(db: AsyncSession, doc_id: str) -> Optional[str]:
+        """Text still held on the row by a document not yet moved to the content store"""
+        return await db.scalar(select(Document.text_content).where(Document.id == doc_id))
     
     @staticmethod
-    def delete_document(db: Session, doc_id: str, user_id: str) -> bool:
-        """Delete document"""
-        document = DocumentService.get_document(db, doc_id, user_id)
-        db.delete(document)
-        db.commit()
+    async def text_in_use_async(db: AsyncSession, text_key: str) -> bool:
+        """Whether any document still references a stored text (identical uploads share one)"""
+        return await db.scalar(select(Document.id).where(Document.text_key == text_key).limit(1)) is not None
+    
+    @staticmethod
+    async def delete_document_async(db: AsyncSession, doc_id: str, user_id: str) -> bool:
+        """Delete document without blocking the event loop"""
+        document = await DocumentService.get_document_async(db, doc_id, user_id)
+        await db.delete(document)
+        await db.commit()
         return True
 
 
@@ -115,23 +188,49 @@ class ChatService:
     """Service for chat operations"""
     
     @staticmethod
-    def create_chat_message(db: Session, workflow_id: str, user_id: str, query: str, response: Optional[str] = None) -> ChatMessage:
-        """Create a chat message"""
+    async def create_chat_message_async(
+        db: AsyncSession,
+        workflow_id: str,
+        user_id: str,
+        query: str,
+        response: Optional[str] = None,
+        execution_data: Optional[dict] = None
+    ) -> ChatMessage:
+        """Create a chat message without blocking the event loop"""
         message = ChatMessage(
             workflow_id=workflow_id,
             user_id=user_id,
             query=query,
-            response=response
+            response=response,
+            execution_data=execution_data
         )
         db.add(message)
-        db.commit()
-        db.refresh(message)
+        await db.commit()
         return message
     
     @staticmethod
-    def get_chat_history(db: Session, workflow_id: str, user_id: str) -> List[ChatMessage]:
-        """Get chat history for a workflow"""
-        return db.query(ChatMessage).filter(
+    async def bulk_create_chat_messages_async(db: AsyncSession, rows: List[dict]) -> int:
+        """Insert many chat messages in one statement without blocking the event loop"""
+        if rows:
+            await db.execute(insert(ChatMessage), rows)
+            await db.commit()
+        return len(rows)
+    
+    @staticmethod
+    async def get_chat_history_async(
+        db: AsyncSession,
+        workflow_id: str,
+        user_id: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_execution_data: bool = False,
+        oldest_first: bool = False
+    ) -> Page:
+        """One page of a workflow's chat history, newest first unless oldest_first; execution data only on request"""
+        excluded = () if include_execution_data else ("execution_data",)
+        query = select(*_columns_except(ChatMessage, *excluded)).where(
             ChatMessage.workflow_id == workflow_id,
             ChatMessage.user_id == user_id
-        ).order_by(ChatMessage.created_at).all()
+        )
+        result = await db.execute(keyset_page(query, ChatMessage, cursor, limit, descending=not oldest_first))
+        return to_page(list(result.all()), limit)
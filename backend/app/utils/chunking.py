@@ -0,0 +1,242 @@
+import os
+import re
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "sentence")  # fixed, sentence or token
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))  # characters for fixed/sentence
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))  # budget for the token strategy
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "20"))
+
+WORD_BOUNDARY = re.compile(r"\s+")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n")
+TOKEN = re.compile(r"\w+|[^\w\s]")
+DIGITS = re.compile(r"\d+")
+
+# Characters kept past a window before it is cut while streaming, so a
+# boundary or token that straddles the end of the buffer is not split early
+STREAM_LOOKAHEAD = 64
+
+
+class ChunkStats:
+    """Per-document chunking statistics"""
+
+    def __init__(self):
+        self.chunks = 0
+        self.characters = 0
+        self.duplicates_dropped = 0
+        self.boilerplate_lines_dropped = 0
+
+    @property
+    def average_chars(self) -> float:
+        return self.characters / self.chunks if self.chunks else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "characters": self.characters,
+            "average_chars": round(self.average_chars, 1),
+            "duplicates_dropped": self.duplicates_dropped,
+            "boilerplate_lines_dropped": self.boilerplate_lines_dropped,
+        }
+
+
+def fingerprint(text: str) -> str:
+    """Hash of a line ignoring case, digits and whitespace, so running headers/footers
+    with page numbers or dates match across pages"""
+    normalized = DIGITS.sub("0", " ".join(text.lower().split()))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    """Hash of a chunk with only whitespace normalized; chunks differing in a number stay distinct"""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def strip_repeated_lines(pages: Iterable[str], min_repeats: int = 3, edge_lines: int = 2,
+                         stats: Optional[ChunkStats] = None) -> Iterator[str]:
+    """Drop header/footer lines once they have repeated at the edge of earlier pages"""
+    seen = Counter()
+    for page in pages:
+        lines = page.splitlines(keepends=True)
+        edges = set(range(min(edge_lines, len(lines)))) | set(range(max(len(lines) - edge_lines, 0), len(lines)))
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edges and line.strip():
+                key = fingerprint(line)
+                seen[key] += 1
+                if seen[key] > min_repeats:
+                    if stats is not None:
+                        stats.boilerplate_lines_dropped += 1
+                    continue
+            kept.append(line)
+        yield "".join(kept)
+
+
+class Chunker:
+    """Splits text at precomputed boundary offsets.
+
+    Boundaries are found once per text with a regex scan; each chunk end is
+    then picked with a binary search over those offsets, so no chunk is cut
+    mid-word unless a single word exceeds the window.
+    """
+
+    boundary_patterns: Tuple[re.Pattern, ...] = (WORD_BOUNDARY,)
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                 min_fill: float = 0.5, dedupe: bool = True):
+        if overlap >= chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.min_fill = min_fill
+        self.dedupe = dedupe
+
+    def _prepare(self, text: str):
+        """Precompute per-text offsets; returns (boundary tiers, extra state)"""
+        tiers = [[m.end() for m in pattern.finditer(text)] for pattern in self.boundary_patterns]
+        return tiers, None
+
+    def _limit(self, text: str, start: int, state) -> int:
+        """Furthest offset a chunk starting at start may end at"""
+        return start + self.chunk_size
+
+    def _overlap_from(self, text: str, start: int, end: int, state) -> int:
+        """Offset from which the overlap with the next chunk begins"""
+        return end - self.overlap
+
+    def _split(self, text: str, final: bool) -> Tuple[List[Tuple[int, int]], int]:
+        """Return chunk spans and the offset where unconsumed text starts"""
+        tiers, state = self._prepare(text)
+        spans = []
+        start = 0
+        length = len(text)
+        while start < length:
+            limit = self._limit(text, start, state)
+            if limit >= length:
+                if not final:
+                    break
+                spans.append((start, length))
+                return spans, length
+            if not final and limit + STREAM_LOOKAHEAD > length:
+                break
+
+            # Prefer the strongest boundary that still fills enough of the window
+            end = limit
+            floor = start + self.min_fill * (limit - start)
+            for cuts in tiers:
+                i = bisect_right(cuts, limit) - 1
+                if i >= 0 and cuts[i] > start and cuts[i] >= floor:
+                    end = cuts[i]
+                    break
+            spans.append((start, end))
+
+            # Start the next chunk on a boundary inside the overlap region
+            next_start = end
+            overlap_from = self._overlap_from(text, start, end, state)
+            cuts = tiers[-1]
+            j = bisect_left(cuts, overlap_from)
+            if j < len(cuts) and cuts[j] < end:
+                next_start = cuts[j]
+            start = max(next_start, start + 1)
+        return spans, start
+
+    def _emit(self, chunk: str, seen: set, stats: Optional[ChunkStats]) -> bool:
+        chunk = chunk.strip()
+        if not chunk:
+            return False
+        if self.dedupe:
+            key = chunk_hash(chunk)
+            if key in seen:
+                if stats is not None:
+                    stats.duplicates_dropped += 1
+                return False
+            seen.add(key)
+        if stats is not None:
+            stats.chunks += 1
+            stats.characters += len(chunk)
+        return True
+
+    def iter_chunks(self, pages: Iterable[str], stats: Optional[ChunkStats] = None) -> Iterator[str]:
+        """Chunk a stream of pages, carrying unfinished text across page boundaries"""
+        seen = set()
+        buffer = ""
+        for page in pages:
+            buffer += page
+            spans, consumed = self._split(buffer, final=False)
+            for start, end in spans:
+                chunk = buffer[start:end].strip()
+                if self._emit(chunk, seen, stats):
+                    yield chunk
+            buffer = buffer[consumed:]
+        spans, _ = self._split(buffer, final=True)
+        for start, end in spans:
+            chunk = buffer[start:end].strip()
+            if self._emit(chunk, seen, stats):
+                yield chunk
+
+    def chunk(self, text: str, stats: Optional[ChunkStats] = None) -> List[str]:
+        """Split a complete text into chunks"""
+        return list(self.iter_chunks([text], stats))
+
+
+class FixedChunker(Chunker):
+    """Fixed-size character windows that end on whitespace"""
+
+
+class SentenceChunker(Chunker):
+    """Character windows that end on sentence or paragraph breaks where possible"""
+
+    boundary_patterns = (SENTENCE_BOUNDARY, WORD_BOUNDARY)
+
+
+class TokenBudgetChunker(SentenceChunker):
+    """Windows sized by an approximate token budget instead of characters"""
+
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 min_fill: float = 0.5, dedupe: bool = True):
+        super().__init__(chunk_size=max_tokens, overlap=overlap_tokens, min_fill=min_fill, dedupe=dedupe)
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _prepare(self, text: str):
+        tiers, _ = super()._prepare(text)
+        starts, ends = [], []
+        for m in TOKEN.finditer(text):
+            starts.append(m.start())
+            ends.append(m.end())
+        return tiers, (starts, ends)
+
+    def _limit(self, text: str, start: int, state) -> int:
+        starts, ends = state
+        first = bisect_left(starts, start)
+        last = first + self.max_tokens - 1
+        if last >= len(ends):
+            return len(text)
+        return ends[last]
+
+    def _overlap_from(self, text: str, start: int, end: int, state) -> int:
+        starts, _ = state
+        last = bisect_left(starts, end)
+        return starts[max(last - self.overlap_tokens, 0)] if starts else end
+
+
+CHUNKERS = {
+    "fixed": FixedChunker,
+    "sentence": SentenceChunker,
+    "token": TokenBudgetChunker,
+}
+
+
+def get_chunker(strategy: Optional[str] = None, **kwargs) -> Chunker:
+    """Build a chunker for the named strategy (defaults to CHUNKING_STRATEGY)"""
+    strategy = strategy or CHUNKING_STRATEGY
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    return CHUNKERS[strategy](**kwargs)
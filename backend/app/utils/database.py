@@ -1,13 +1,32 @@
 import os
+from alembic import command
+from alembic.config import Config
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from app.models.base import Base
+from typing import AsyncIterator
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
+# asyncio drivers for the same database, used by request handlers
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """The given database URL with its asyncio driver (asyncpg / aiosqlite)"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.drivername == driver:
+        return url.render_as_string(hide_password=False)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
 engine = create_engine(
     DATABASE_URL,
     echo=os.getenv("DEBUG", "false").lower() == "true",
@@ -18,6 +37,17 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=os.getenv("DEBUG", "false").lower() == "true",
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20
+)
+
+# Objects stay usable after commit; lazy loads are not available on async sessions
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db() -> Session:
     """Dependency to get database session"""
@@ -28,6 +58,32 @@ def get_db() -> Session:
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session (doesn't block the event loop)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# backend/alembic holds the migrations
+ALEMBIC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic")
+# The schema create_all built before there were migrations
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(connection=None) -> Config:
+    """Alembic configuration for running the migrations from code, on the given connection"""
+    # No ini file, so the app's logging configuration is left alone
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_PATH)
+    config.attributes["connection"] = connection
+    return config
+
+
 def init_db():
-    """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    """Bring the database schema up to date with the migrations"""
+    with engine.begin() as connection:
+        config = alembic_config(connection)
+        tables = inspect(connection).get_table_names()
+        if "users" in tables and "alembic_version" not in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
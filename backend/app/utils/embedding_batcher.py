@@ -0,0 +1,90 @@
+import asyncio
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Collects concurrent encode requests and runs them as one batched call.
+
+    Callers get a Future per text; a background thread waits up to
+    max_wait_ms after the first request (or until max_batch_size requests
+    are queued) and then encodes the whole batch at once.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], Sequence], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding and return a future for its embedding"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str) -> List[float]:
+        """Encode a single text, blocking until its batch completes"""
+        return self.submit(text).result()
+
+    async def encode_async(self, text: str) -> List[float]:
+        """Encode a single text without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts, futures = [], []
+            for text, future in batch:
+                if future.set_running_or_notify_cancel():  # skip callers that gave up
+                    texts.append(text)
+                    futures.append(future)
+            if not texts:
+                continue
+            try:
+                embeddings = self.encode_fn(texts)
+                for future, embedding in zip(futures, embeddings):
+                    future.set_result(embedding.tolist() if hasattr(embedding, "tolist") else list(embedding))
+            except Exception as e:
+                logger.error(f"Error encoding batch of {len(texts)} texts: {e}")
+                for future in futures:
+                    future.set_exception(e)
+            self.batches += 1
+            self.requests += len(texts)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "average_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
@@ -1,40 +1,139 @@
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Optional
+import threading
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from app.utils.embedding_batcher import EmbeddingBatcher
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.executors import cpu_pool, io_pool, encode_in_worker
+from app.utils.vector_store import VectorStore, create_vector_store
+from app.utils.cache import LRUCache
 
 load_dotenv()
 
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")  # chroma or numpy
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", CHROMA_PATH if VECTOR_STORE == "chroma" else "./vector_store")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")  # empty disables the cache
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+
+
+def user_collection_name(user_id: str) -> str:
+    """Collection holding every document chunk for a user, tagged by source document"""
+    return f"user_{user_id}"
+
+
+def legacy_collection_name(document_id: str) -> str:
+    """Per-document collection used before chunks were stored per user"""
+    return f"doc_{document_id}"
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so trivially different spellings share a cache entry"""
+    return " ".join(query.split())
 
 
 class EmbeddingService:
     """Service for managing embeddings and vector store"""
     
     def __init__(self):
-        self.chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        # The model, vector store and cache are loaded on first use (or by warm_up)
+        self._vector_store = None
+        self._embedding_model = None
+        self._embedding_cache = None
+        self._worker_model_ready = False
+        self._lock = threading.Lock()
+        # Query embeddings from concurrent requests are encoded together
+        self.query_batcher = EmbeddingBatcher(
+            self._encode,
+            max_batch_size=EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=EMBED_BATCH_MAX_WAIT_MS
+        )
+        # Recently embedded queries, keyed by (model, normalized text)
+        self.query_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
     
-    def get_or_create_collection(self, collection_name: str):
-        """Get or create a ChromaDB collection"""
-        try:
-            return self.chroma_client.get_collection(collection_name)
-        except Exception:
-            return self.chroma_client.create_collection(collection_name)
+    @property
+    def vector_store(self) -> VectorStore:
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    store = create_vector_store(VECTOR_STORE, VECTOR_STORE_PATH)
+                    store.warm_up()
+                    self._vector_store = store
+        return self._vector_store
     
-    def add_documents(self, collection_name: str, documents: List[str], document_id: str) -> bool:
-        """Add documents to collection with embeddings"""
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            with self._lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        return self._embedding_model
+    
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        if self._embedding_cache is None and EMBEDDING_CACHE_PATH:
+            with self._lock:
+                if self._embedding_cache is None:
+                    self._embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+        return self._embedding_cache
+    
+    def warm_up(self):
+        """Load the embedding model, vector store client and cache ahead of the first request"""
+        if cpu_pool.kind == "process":
+            self._encode(["warm up"])
+            self._worker_model_ready = True
+        else:
+            self.embedding_model
+        self.vector_store
+        self.embedding_cache
+    
+    def status(self) -> dict:
+        """Report which components have been loaded"""
+        return {
+            "embedding_model": self._embedding_model is not None or self._worker_model_ready,
+            "vector_store": self._vector_store is not None,
+        }
+    
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Encode texts on the CPU executor (a worker process holds its own model)"""
+        if cpu_pool.kind == "process":
+            return cpu_pool.call(encode_in_worker, texts)
+        return cpu_pool.call(lambda: self.embedding_model.encode(texts).tolist())
+    
+    def encode_documents(self, documents: List[str]) -> List[List[float]]:
+        """Encode chunks, reusing cached embeddings for text seen before"""
+        if self.embedding_cache is None:
+            return self._encode(documents)
+        
+        embeddings = self.embedding_cache.get_many(EMBEDDING_MODEL, documents)
+        missing = list(dict.fromkeys(doc for doc, emb in zip(documents, embeddings) if emb is None))
+        if missing:
+            encoded = dict(zip(missing, self._encode(missing)))
+            self.embedding_cache.put_many(EMBEDDING_MODEL, missing, [encoded[doc] for doc in missing])
+            embeddings = [emb if emb is not None else encoded[doc] for doc, emb in zip(documents, embeddings)]
+        return embeddings
+    
+    def add_documents(self, collection_name: str, documents: List[str], document_id: str, start_index: int = 0) -> bool:
+        """Add documents to collection with embeddings
+
+        start_index offsets the chunk ids so a document can be added in batches.
+        """
+        if not documents:
+            return True
         try:
-            collection = self.get_or_create_collection(collection_name)
-            
             # Generate embeddings
-            embeddings = self.embedding_model.encode(documents).tolist()
+            embeddings = self.encode_documents(documents)
             
             # Add to collection
-            ids = [f"{document_id}_chunk_{i}" for i in range(len(documents))]
-            collection.add(
+            ids = [f"{document_id}_chunk_{start_index + i}" for i in range(len(documents))]
+            self.vector_store.add(
+                collection_name,
                 ids=ids,
                 embeddings=embeddings,
                 documents=documents,
@@ -45,28 +144,104 @@ class EmbeddingService:
             print(f"Error adding documents to collection: {e}")
             return False
     
-    def query_collection(self, collection_name: str, query: str, n_results: int = 5) -> Optional[List[str]]:
-        """Query collection and return relevant documents"""
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, from the query cache or through the micro-batcher"""
+        query = normalize_query(query)
+        key = (EMBEDDING_MODEL, query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = self.query_batcher.encode(query)
+            self.query_cache.set(key, embedding)
+        return embedding
+    
+    async def embed_query_async(self, query: str) -> List[float]:
+        """Embed a query without blocking the event loop"""
+        query = normalize_query(query)
+        key = (EMBEDDING_MODEL, query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = await self.query_batcher.encode_async(query)
+            self.query_cache.set(key, embedding)
+        return embedding
+    
+    async def embed_queries_async(self, queries: List[str], batch_size: int = 256) -> int:
+        """Embed many queries in large batches ahead of use, keeping them in the query cache;
+        returns the number encoded"""
+        pending = list(dict.fromkeys(normalize_query(query) for query in queries))
+        pending = [query for query in pending if self.query_cache.get((EMBEDDING_MODEL, query)) is None]
+        pending = pending[:self.query_cache.max_size]
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            for query, embedding in zip(batch, await io_pool.run(self._encode, batch)):
+                self.query_cache.set((EMBEDDING_MODEL, query), embedding)
+        return len(pending)
+    
+    def cache_stats(self) -> dict:
+        """Hit-rate counters for the query, collection and chunk embedding caches"""
+        return {
+            "query_embeddings": self.query_cache.stats(),
+            "collections": self._vector_store.cache_stats() if self._vector_store else {},
+            "chunk_embeddings": self._embedding_cache.stats() if self._embedding_cache else {},
+        }
+    
+    def search(
+        self,
+        targets: Dict[str, List[str]],
+        query: str,
+        n_results: int = RETRIEVAL_TOP_K,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[str]:
+        """Return the global top-k chunks across documents
+
+        targets maps collection name -> source document ids to search in it.
+        Documents sharing a collection are covered by one filtered query, and
+        results from several collections are merged by distance.
+        """
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        matches = []
+        for collection_name, document_ids in targets.items():
+            if not document_ids:
+                continue
+            where = {"source": document_ids[0]} if len(document_ids) == 1 else {"source": {"$in": document_ids}}
+            try:
+                results = self.vector_store.query(collection_name, query_embedding, n_results, where=where)
+            except Exception as e:
+                print(f"Error querying collection: {e}")
+                continue
+            matches.extend((distance, document) for distance, document, _ in results)
+        
+        matches.sort(key=lambda match: match[0])
+        return [document for _, document in matches[:n_results]]
+    
+    async def search_async(
+        self,
+        targets: Dict[str, List[str]],
+        query: str,
+        n_results: int = RETRIEVAL_TOP_K,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[str]:
+        """Run search without blocking the event loop"""
+        if query_embedding is None:
+            query_embedding = await self.embed_query_async(query)
+        return await io_pool.run(self.search, targets, query, n_results, query_embedding)
+    
+    def delete_document(self, collection_name: str, document_id: str) -> bool:
+        """Delete a document's chunks, dropping the collection if it is a legacy per-document one"""
+        if collection_name == legacy_collection_name(document_id):
+            return self.delete_collection(collection_name)
         try:
-            collection = self.get_or_create_collection(collection_name)
-            query_embedding = self.embedding_model.encode([query])[0].tolist()
-            
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
-            )
-            
-            if results and results['documents']:
-                return results['documents'][0]
-            return []
+            self.vector_store.delete(collection_name, where={"source": document_id})
+            return True
         except Exception as e:
-            print(f"Error querying collection: {e}")
-            return []
+            print(f"Error deleting document chunks: {e}")
+            return False
     
     def delete_collection(self, collection_name: str) -> bool:
         """Delete a collection"""
         try:
-            self.chroma_client.delete_collection(collection_name)
+            self.vector_store.delete_collection(collection_name)
             return True
         except Exception as e:
             print(f"Error deleting collection: {e}")
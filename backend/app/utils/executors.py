@@ -0,0 +1,155 @@
+import os
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from functools import partial
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IO_EXECUTOR_THREADS = int(os.getenv("IO_EXECUTOR_THREADS", "8"))
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Where CPU-bound work (embedding, PDF parsing) runs: "thread" suits GIL-releasing
+# torch/PyMuPDF calls, "process" isolates it in workers with a preloaded model
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "thread")
+
+
+def _start_iteration(fn: Callable, *args, **kwargs):
+    return iter(fn(*args, **kwargs))
+
+
+class ExecutorPool:
+    """Lazily created thread or process pool that tracks queue depth"""
+
+    def __init__(self, name: str, kind: str, max_workers: int, initializer: Optional[Callable] = None,
+                 initargs: tuple = ()):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            initializer=self.initializer,
+                            initargs=self.initargs
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix=self.name,
+                            initializer=self.initializer,
+                            initargs=self.initargs
+                        )
+        return self._executor
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Submit work and return a concurrent future"""
+        future = self._get_executor().submit(fn, *args, **kwargs)
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(self._on_done)
+        return future
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run work in the pool and block until it finishes (for use off the event loop)"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run work in the pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.wrap_future(self.submit(partial(fn, *args, **kwargs)), loop=loop)
+
+    async def iterate(self, fn: Callable, *args, **kwargs):
+        """Consume a blocking iterator in the pool, yielding items as they are produced
+
+        Thread pools only: the iterator lives in the pool between items, and
+        iterators cannot be passed to or from a worker process.
+        """
+        if self.kind == "process":
+            raise TypeError(f"{self.name} is a process pool; iterate() needs a thread pool")
+        iterator = await self.run(_start_iteration, fn, *args, **kwargs)
+        done = object()
+        while True:
+            item = await self.run(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = self.submitted - self.completed - self.failed
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "in_flight": in_flight,
+            "queue_depth": max(in_flight - self.max_workers, 0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# Model instance held by each process-pool worker
+_worker_model = None
+
+
+def _init_cpu_worker(model_name: str):
+    """Process-pool initializer: load the embedding model once per worker"""
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def encode_in_worker(texts: List[str]) -> List[List[float]]:
+    """Encode texts with the worker's preloaded model"""
+    return _worker_model.encode(texts).tolist()
+
+
+# Blocking I/O such as vector store queries and text store reads (LLM calls use the dispatcher's pool)
+io_pool = ExecutorPool("io", "thread", IO_EXECUTOR_THREADS)
+
+# CPU-bound embedding and PDF parsing
+if CPU_EXECUTOR == "process":
+    cpu_pool = ExecutorPool(
+        "cpu", "process", CPU_EXECUTOR_WORKERS,
+        _init_cpu_worker, (os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),)
+    )
+else:
+    cpu_pool = ExecutorPool("cpu", "thread", CPU_EXECUTOR_WORKERS)
+
+
+def executor_stats() -> dict:
+    return {"io": io_pool.stats(), "cpu": cpu_pool.stats()}
+
+
+def shutdown_executors(wait: bool = True):
+    io_pool.shutdown(wait=wait)
+    cpu_pool.shutdown(wait=wait)
@@ -1,7 +1,10 @@
 import os
+import uuid
 import fitz  # PyMuPDF
-from typing import Optional
+from typing import Iterable, Iterator, List
 from pathlib import Path
+from app.utils.executors import cpu_pool
+from app.utils.text_store import text_store
 
 UPLOAD_DIR = "./uploads"
 
@@ -11,38 +14,57 @@ def create_upload_dir():
     Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file using PyMuPDF"""
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yield the text of each PDF page without holding the whole document"""
+    doc = fitz.open(file_path)
     try:
-        doc = fitz.open(file_path)
-        text = ""
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text += page.get_text()
+        for page in doc:
+            yield page.get_text()
+    finally:
         doc.close()
-        return text
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return ""
 
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> list:
-    """Split text into overlapping chunks"""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        if chunk.strip():  # Only add non-empty chunks
-            chunks.append(chunk)
-        start = end - overlap
-    return chunks
+def count_pdf_pages(file_path: str) -> int:
+    """Return the number of pages in a PDF"""
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def store_pdf_text(file_path: str) -> str:
+    """Store a PDF's pages in the text store and return their key"""
+    return text_store.put(iter_pdf_pages(file_path))
+
+
+async def store_pdf_text_async(file_path: str) -> str:
+    """Store a PDF's pages in the text store on the CPU executor"""
+    return await cpu_pool.run(store_pdf_text, file_path)
+
+
+async def count_pdf_pages_async(file_path: str) -> int:
+    """Count PDF pages on the CPU executor"""
+    return await cpu_pool.run(count_pdf_pages, file_path)
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 def save_uploaded_file(filename: str, content: bytes) -> str:
-    """Save uploaded file and return path"""
+    """Save uploaded file under a name of its own and return path
+
+    Ingestion reads the file after the request returns, so uploads that share a
+    client filename must not overwrite each other.
+    """
     create_upload_dir()
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_{os.path.basename(filename)}")
     with open(file_path, "wb") as f:
         f.write(content)
     return file_path
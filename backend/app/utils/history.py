@@ -0,0 +1,61 @@
+import os
+from typing import List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+# Share of the budget given to the summary of turns that no longer fit verbatim
+CHAT_HISTORY_SUMMARY_SHARE = float(os.getenv("CHAT_HISTORY_SUMMARY_SHARE", "0.25"))
+SUMMARY_TURN_CHARS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) without a tokenizer round trip"""
+    return (len(text) + 3) // 4
+
+
+def _turn_text(turn: dict) -> str:
+    return " ".join(str(part) for part in turn["parts"])
+
+
+def window_history(turns: List[dict], budget: int = CHAT_HISTORY_TOKEN_BUDGET) -> List[dict]:
+    """Fit Gemini-style turns ({"role", "parts"}) into a token budget.
+
+    The most recent turns are kept verbatim; older ones are condensed into a
+    single summary turn, clipped to SUMMARY_TURN_CHARS each, newest first
+    until the summary share of the budget is spent.
+    """
+    if sum(estimate_tokens(_turn_text(turn)) for turn in turns) <= budget:
+        return turns
+
+    verbatim_budget = int(budget * (1 - CHAT_HISTORY_SUMMARY_SHARE))
+    kept, used = [], 0
+    for turn in reversed(turns):
+        tokens = estimate_tokens(_turn_text(turn))
+        if used + tokens > verbatim_budget:
+            break
+        kept.append(turn)
+        used += tokens
+    kept.reverse()
+    older = turns[:len(turns) - len(kept)]
+
+    summary_budget = budget - used
+    lines = []
+    for turn in reversed(older):
+        text = " ".join(_turn_text(turn).split())
+        if len(text) > SUMMARY_TURN_CHARS:
+            text = text[:SUMMARY_TURN_CHARS].rstrip() + "..."
+        line = f"{'User' if turn['role'] == 'user' else 'Assistant'}: {text}"
+        summary_budget -= estimate_tokens(line)
+        if summary_budget < 0:
+            break
+        lines.append(line)
+    if not lines:
+        return kept
+
+    summary = [{"role": "user", "parts": ["Summary of the earlier conversation:\n" + "\n".join(reversed(lines))]}]
+    # Keep roles alternating when the verbatim window opens with a user turn
+    if not kept or kept[0]["role"] == "user":
+        summary.append({"role": "model", "parts": ["Understood."]})
+    return summary + kept
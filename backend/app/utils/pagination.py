@@ -0,0 +1,73 @@
+import os
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, tuple_
+
+load_dotenv()
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page:
+    """One page of rows and the cursor that continues after it"""
+
+    def __init__(self, items: List[Any], next_cursor: Optional[str] = None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def set_header(self, response: Response):
+        if self.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = self.next_cursor
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Opaque cursor for the position just after a row"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_page(
+    query: Select, model, cursor: Optional[str], limit: Optional[int], descending: bool = False
+) -> Select:
+    """Order by (created_at, id) and start after the cursor; fetches one extra row to detect a next page
+    
+    A cursor only continues the order it was issued in.
+    """
+    position = tuple_(model.created_at, model.id)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.where(position < after if descending else position > after)
+    limit = min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+    if descending:
+        return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    return query.order_by(model.created_at, model.id).limit(limit + 1)
+
+
+def to_page(rows: List[Any], limit: Optional[int]) -> Page:
+    """Trim the extra row fetched by keyset_page and point the cursor at the last row kept"""
+    limit = min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    return Page(rows, encode_cursor(rows[-1].created_at, rows[-1].id))
@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+from app.utils.cache import LRUCache
+from app.utils.embeddings import embedding_service, normalize_query
+
+load_dotenv()
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))  # 0 disables the cache
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Cosine similarity for a paraphrase to reuse an answer; 0 (the default) matches exact queries only.
+# Off by default: embeddings of questions differing only by an entity or number ("revenue in
+# 2023" / "in 2024") are often closer than any useful threshold
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+
+def response_scope(owner: str, settings, document_ids: Optional[Iterable[str]] = None) -> tuple:
+    """Cache scope: answers are only shared between queries with the same owner
+    (a workflow id, or "chat"), the same settings and the same context documents"""
+    fingerprint = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+    return (owner, fingerprint, tuple(sorted(set(document_ids or []))))
+
+
+class CacheLookup:
+    """Outcome of a response cache lookup"""
+
+    def __init__(self, status: str, entry: Optional[dict] = None, similarity: Optional[float] = None,
+                 embedding: Optional[np.ndarray] = None):
+        self.status = status  # hit, semantic_hit, miss or bypass
+        self.entry = entry
+        self.similarity = similarity
+        self.embedding = embedding
+
+    @property
+    def hit(self) -> bool:
+        return self.entry is not None
+
+
+class ResponseCache:
+    """LLM responses keyed by scope and normalized query, with a semantic fallback.
+
+    An exact lookup hashes the query. Where a similarity threshold is set, a
+    miss then compares the query embedding against cached queries in the same
+    scope, and an answer whose query is similar enough is reused. Entries expire after a TTL, the least recently
+    used are evicted past max_size, and invalidate_document drops every answer
+    built on a document.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 similarity_threshold: float = RESPONSE_CACHE_SIMILARITY):
+        self.entries = LRUCache(max(max_size, 1), ttl)
+        self.enabled = max_size > 0
+        self.similarity_threshold = similarity_threshold
+        # scope -> {entry key: unit-length query embedding}
+        self._index: Dict[tuple, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.semantic_hits = 0
+
+    @staticmethod
+    def key(scope: tuple, query: str) -> str:
+        return hashlib.sha256(json.dumps([scope, normalize_query(query).lower()]).encode()).hexdigest()
+
+    async def lookup(self, scope: tuple, query: str, similarity: Optional[float] = None) -> CacheLookup:
+        """Find a cached answer for the query, exactly or by similarity.
+
+        similarity overrides the cache's threshold for this lookup (a workflow
+        can opt in to paraphrase matching); 0 matches exact queries only.
+        """
+        if not self.enabled:
+            return CacheLookup("bypass")
+        entry = self.entries.get(self.key(scope, query))
+        if entry is not None:
+            return CacheLookup("hit", entry)
+        threshold = self.similarity_threshold if similarity is None else similarity
+        if threshold <= 0:
+            return CacheLookup("miss")
+
+        embedding = np.asarray(await embedding_service.embed_query_async(query), dtype=np.float32)
+        embedding /= np.linalg.norm(embedding) or 1.0
+        with self._lock:
+            candidates = list(self._index.get(scope, {}).items())
+        if candidates:
+            similarities = np.stack([vector for _, vector in candidates]) @ embedding
+            for i in np.argsort(-similarities):
+                if similarities[i] < threshold:
+                    break
+                entry = self.entries.get(candidates[i][0])
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return CacheLookup("semantic_hit", entry, round(float(similarities[i]), 4), embedding)
+        return CacheLookup("miss", embedding=embedding)
+
+    def store(self, scope: tuple, query: str, response: str, lookup: Optional[CacheLookup] = None,
+              document_ids: Optional[List[str]] = None):
+        """Cache an answer; pass the miss from lookup to reuse its query embedding"""
+        if not self.enabled:
+            return
+        key = self.key(scope, query)
+        self.entries.set(key, {"response": response, "scope": scope, "documents": set(document_ids or scope[2])})
+        if lookup is not None and lookup.embedding is not None:
+            with self._lock:
+                self._index.setdefault(scope, {})[key] = lookup.embedding
+                if sum(len(vectors) for vectors in self._index.values()) > self.entries.max_size:
+                    self._prune_index()
+
+    def _prune_index(self):
+        """Forget embeddings of evicted or expired entries (call with the lock held)"""
+        live = set(self.entries.keys())
+        self._index = {
+            scope: {key: vector for key, vector in vectors.items() if key in live}
+            for scope, vectors in self._index.items()
+        }
+        self._index = {scope: vectors for scope, vectors in self._index.items() if vectors}
+
+    def invalidate_document(self, document_id: str) -> int:
+        """Drop answers built on a document; returns the number removed"""
+        removed = self.entries.remove_where(lambda key, entry: document_id in entry["documents"])
+        if removed:
+            with self._lock:
+                self._prune_index()
+        return removed
+
+    def invalidate_workflow(self, workflow_id: str) -> int:
+        """Drop answers cached for a workflow (or for "chat"); returns the number removed"""
+        removed = self.entries.remove_where(lambda key, entry: entry["scope"][0] == workflow_id)
+        if removed:
+            with self._lock:
+                self._prune_index()
+        return removed
+
+    def stats(self) -> dict:
+        stats = self.entries.stats()
+        stats.update(enabled=self.enabled, semantic_hits=self.semantic_hits)
+        return stats
+
+
+response_cache = ResponseCache()
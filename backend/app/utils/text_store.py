@@ -0,0 +1,242 @@
+import os
+import gzip
+import json
+import shutil
+import struct
+import hashlib
+import logging
+import tempfile
+from typing import Iterable, List, Optional, Sequence
+from dotenv import load_dotenv
+from app.utils.cache import LRUCache
+from app.utils.executors import io_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TEXT_STORE_PATH = os.getenv("TEXT_STORE_PATH", "./text_store")
+TEXT_STORE_CODEC = os.getenv("TEXT_STORE_CODEC", "zstd")  # zstd (needs the zstandard package) or gzip
+# Pages are compressed together in frames of about this many bytes; a page range read
+# only decompresses the frames it touches
+TEXT_STORE_FRAME_BYTES = int(os.getenv("TEXT_STORE_FRAME_BYTES", "65536"))
+
+# Blob layout: magic, index length, JSON index, then the compressed frames
+MAGIC = b"DTXT1"
+HEADER = struct.Struct(">5sI")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("Text blob is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def text_key(pages: Sequence[bytes]) -> str:
+    """Content address of a document's pages (the same text split differently gets another key)"""
+    digest = hashlib.sha256()
+    for page in pages:
+        _digest_page(digest, page)
+    return digest.hexdigest()
+
+
+def _digest_page(digest, page: bytes):
+    digest.update(struct.pack(">Q", len(page)))
+    digest.update(page)
+
+
+class TextWriter:
+    """Adds one document's pages to a TextStore as they are extracted.
+
+    Compressed frames go to a temporary file as they fill up, so memory holds
+    one frame and the page index rather than the whole text; commit() writes
+    the blob under the content key and returns it.
+    """
+
+    def __init__(self, store: "TextStore"):
+        self.store = store
+        os.makedirs(store.path, exist_ok=True)
+        fd, self._frames_path = tempfile.mkstemp(dir=store.path, suffix=".frames")
+        self._frames = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+        self._current = bytearray()
+        self._frame_offsets = []
+        self._offset = 0
+        self._page_index = []
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_index)
+
+    def add(self, page: str):
+        encoded = page.encode("utf-8")
+        _digest_page(self._digest, encoded)
+        if self._current and len(self._current) + len(encoded) > self.store.frame_bytes:
+            self._flush()
+        self._page_index.append([len(self._frame_offsets), len(self._current), len(self._current) + len(encoded)])
+        self._current += encoded
+
+    def _flush(self):
+        frame = _compress(self.store.codec, bytes(self._current))
+        self._frames.write(frame)
+        self._frame_offsets.append([self._offset, len(frame)])
+        self._offset += len(frame)
+        self._current = bytearray()
+
+    def commit(self) -> str:
+        """Store the pages added so far and return their key"""
+        if self._current:
+            self._flush()
+        key = self._digest.hexdigest()
+        index = json.dumps({"codec": self.store.codec, "frames": self._frame_offsets,
+                            "pages": self._page_index}).encode("utf-8")
+        try:
+            self.store._write_blob(key, index, self._frames)
+        finally:
+            self.abort()
+        return key
+
+    def abort(self):
+        """Discard the temporary frames (safe to call more than once)"""
+        if not self._frames.closed:
+            self._frames.close()
+        if os.path.exists(self._frames_path):
+            os.remove(self._frames_path)
+
+
+class TextStore:
+    """Content-addressed, compressed store for extracted document text on the local filesystem.
+
+    Each document's pages are written once under the hash of their content
+    (identical uploads share a blob) and are read back by page range, so
+    callers never have to load a whole document to show part of it.
+    """
+
+    def __init__(self, path: str = TEXT_STORE_PATH, codec: str = TEXT_STORE_CODEC,
+                 frame_bytes: int = TEXT_STORE_FRAME_BYTES):
+        if codec == "zstd" and _zstandard() is None:
+            logger.warning("zstandard is not installed, compressing document text with gzip")
+            codec = "gzip"
+        self.path = path
+        self.codec = codec
+        self.frame_bytes = frame_bytes
+        # Blobs never change, so their indexes can be cached by key
+        self._indexes = LRUCache(256)
+        self.writes = 0
+        self.deduplicated = 0
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._blob_path(key))
+
+    def writer(self) -> TextWriter:
+        """Incremental writer for a document whose pages arrive one at a time"""
+        return TextWriter(self)
+
+    def put(self, pages: Iterable[str]) -> str:
+        """Store a document's pages and return their key"""
+        writer = self.writer()
+        try:
+            for page in pages:
+                writer.add(page)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def _write_blob(self, key: str, index: bytes, frames):
+        """Write header, index and the frames file as the blob for key, unless it already exists"""
+        path = self._blob_path(key)
+        if os.path.exists(path):
+            self.deduplicated += 1
+            return
+
+        # Write to a temporary file first so readers never see a partial blob
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(index)))
+                f.write(index)
+                frames.seek(0)
+                shutil.copyfileobj(frames, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.writes += 1
+
+    def _read_index(self, f, key: str) -> tuple:
+        cached = self._indexes.get(key)
+        if cached is not None:
+            return cached
+        magic, index_length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not a text blob: {key}")
+        index = json.loads(f.read(index_length))
+        entry = (index, HEADER.size + index_length)
+        self._indexes.set(key, entry)
+        return entry
+
+    def page_count(self, key: str) -> int:
+        with open(self._blob_path(key), "rb") as f:
+            index, _ = self._read_index(f, key)
+        return len(index["pages"])
+
+    def read_pages(self, key: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """Pages start..end-1 of a stored document, decompressing only the frames they span"""
+        with open(self._blob_path(key), "rb") as f:
+            index, data_offset = self._read_index(f, key)
+            wanted = index["pages"][start:end]
+            frames = {}
+            for frame_number, _, _ in wanted:
+                if frame_number not in frames:
+                    offset, length = index["frames"][frame_number]
+                    f.seek(data_offset + offset)
+                    frames[frame_number] = _decompress(index["codec"], f.read(length))
+        return [frames[frame_number][s:e].decode("utf-8") for frame_number, s, e in wanted]
+
+    def read_text(self, key: str) -> str:
+        return "".join(self.read_pages(key))
+
+    async def read_pages_async(self, key: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """Read a page range on the I/O executor"""
+        return await io_pool.run(self.read_pages, key, start, end)
+
+    def delete(self, key: str):
+        self._indexes.pop(key)
+        try:
+            os.remove(self._blob_path(key))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "codec": self.codec,
+            "writes": self.writes,
+            "deduplicated": self.deduplicated,
+            "index_cache": self._indexes.stats(),
+        }
+
+
+text_store = TextStore()
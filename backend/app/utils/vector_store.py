@@ -0,0 +1,388 @@
+import os
+import json
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.cache import LRUCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized within one process
+    fcntl = None
+
+# (distance, document text, metadata)
+Match = Tuple[float, str, dict]
+
+
+class VectorStore(ABC):
+    """Collection-oriented store of embeddings with their chunk text and metadata.
+
+    Distances are squared L2 for every backend so results from different
+    collections can be merged.
+    """
+
+    @abstractmethod
+    def add(self, collection: str, ids: List[str], embeddings: List[List[float]],
+            documents: List[str], metadatas: List[dict]):
+        """Add vectors to a collection, creating it if needed"""
+
+    @abstractmethod
+    def query(self, collection: str, embedding: List[float], n_results: int,
+              where: Optional[dict] = None) -> List[Match]:
+        """Return the nearest entries, closest first"""
+
+    @abstractmethod
+    def delete(self, collection: str, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        """Delete entries by id or metadata filter"""
+
+    @abstractmethod
+    def count(self, collection: str) -> int:
+        """Number of entries in a collection"""
+
+    @abstractmethod
+    def delete_collection(self, collection: str):
+        """Drop a collection and all its entries"""
+
+    def warm_up(self):
+        """Open connections or files ahead of the first request"""
+
+    def cache_stats(self) -> dict:
+        """Hit-rate counters for cached collection handles"""
+        return {}
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore backed by a Chroma PersistentClient"""
+
+    def __init__(self, path: str, max_open_collections: int = 256):
+        self.path = path
+        self._client = None
+        self._lock = threading.Lock()
+        self._handles = LRUCache(max_open_collections)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    def get_collection(self, collection: str):
+        """Get or create a collection, reusing handles opened earlier"""
+        return self._handles.get_or_set(collection, lambda: self.client.get_or_create_collection(collection))
+
+    def add(self, collection, ids, embeddings, documents, metadatas):
+        self.get_collection(collection).add(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def query(self, collection, embedding, n_results, where=None):
+        results = self.get_collection(collection).query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            where=where
+        )
+        if not results or not results["documents"]:
+            return []
+        metadatas = results.get("metadatas") or [[{}] * len(results["documents"][0])]
+        return list(zip(results["distances"][0], results["documents"][0], metadatas[0]))
+
+    def delete(self, collection, ids=None, where=None):
+        self.get_collection(collection).delete(ids=ids, where=where)
+
+    def count(self, collection):
+        return self.get_collection(collection).count()
+
+    def delete_collection(self, collection):
+        self._handles.pop(collection)
+        self.client.delete_collection(collection)
+
+    def warm_up(self):
+        self.client
+
+    def cache_stats(self):
+        return self._handles.stats()
+
+
+class _Segment:
+    """One immutable batch of vectors: a memory-mapped .npy matrix plus a JSON sidecar"""
+
+    def __init__(self, directory: str, name: str, deleted: Optional[List[int]] = None):
+        self.name = name
+        self.matrix = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.ids: List[str] = sidecar["ids"]
+        self.documents: List[str] = sidecar["documents"]
+        self.metadatas: List[dict] = sidecar["metadatas"]
+        self.norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.set_deleted(deleted)
+        self.id_index = {entry_id: row for row, entry_id in enumerate(self.ids)}
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def column(self, key: str) -> np.ndarray:
+        """Metadata values for one key as an array, for vectorized filtering"""
+        if key not in self._columns:
+            self._columns[key] = np.array([metadata.get(key) for metadata in self.metadatas], dtype=object)
+        return self._columns[key]
+
+    def filter_mask(self, where: dict) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            values = self.column(key)
+            if isinstance(condition, dict):
+                if "$in" in condition:
+                    mask &= np.isin(values, list(condition["$in"]))
+                if "$eq" in condition:
+                    mask &= values == condition["$eq"]
+            else:
+                mask &= values == condition
+        return mask
+
+    def set_deleted(self, deleted: Optional[List[int]]):
+        """Replace the tombstones (as one assignment, so a concurrent query sees old or new)"""
+        alive = np.ones(len(self.ids), dtype=bool)
+        if deleted:
+            alive[deleted] = False
+        self.alive = alive
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process VectorStore over memory-mapped float32 .npy files.
+
+    Each collection is a directory of append-only segments; a query is one
+    matrix-vector product per segment followed by a partial sort. Deletes are
+    recorded as per-segment tombstones and folded away by compaction.
+
+    Several processes can share a directory (ingestion workers with
+    INGESTION_EXECUTOR=process): an open collection is reloaded when its
+    manifest changes on disk, and writers hold a per-collection file lock.
+    """
+
+    def __init__(self, path: str, max_segments: int = 16, max_open_collections: int = 256):
+        self.path = path
+        self.max_segments = max_segments
+        # Open collections as (manifest stamp, segments); every write is persisted,
+        # so an evicted or stale one reloads from disk
+        self._collections = LRUCache(max_open_collections)
+        self._lock = threading.RLock()
+
+    def _dir(self, collection: str) -> str:
+        return os.path.join(self.path, collection)
+
+    def _manifest_path(self, collection: str) -> str:
+        return os.path.join(self._dir(collection), "manifest.json")
+
+    def _manifest_stamp(self, collection: str) -> Optional[tuple]:
+        """Identifies the manifest version on disk; each save replaces the file, so the inode changes too"""
+        try:
+            stat = os.stat(self._manifest_path(collection))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @contextmanager
+    def _write_lock(self, collection: str):
+        """Serialize writes to a collection across threads and, where flock exists, processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = self._dir(collection)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, collection: str, retries: int = 3) -> List[_Segment]:
+        """A collection's segments, cached while its manifest on disk is unchanged"""
+        stamp = self._manifest_stamp(collection)
+        cached = self._collections.get(collection)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        if stamp is None:
+            segments = []
+        else:
+            directory = self._dir(collection)
+            opened = {segment.name: segment for segment in cached[1]} if cached is not None else {}
+            try:
+                with open(self._manifest_path(collection), encoding="utf-8") as f:
+                    manifest = json.load(f)
+                segments = []
+                for name in manifest["segments"]:
+                    # Segment files never change; only the tombstones need refreshing
+                    segment = opened.get(name)
+                    if segment is None:
+                        segment = _Segment(directory, name, manifest["deleted"].get(name))
+                    else:
+                        segment.set_deleted(manifest["deleted"].get(name))
+                    segments.append(segment)
+            except (FileNotFoundError, json.JSONDecodeError):
+                # Another process compacted or rewrote the collection meanwhile
+                if retries <= 0:
+                    raise
+                return self._load(collection, retries - 1)
+        self._collections.set(collection, (stamp, segments))
+        return segments
+
+    def _save_manifest(self, collection: str, segments: List[_Segment],
+                       tombstones: Optional[Dict[str, np.ndarray]] = None):
+        """Persist the segment list and tombstones, and cache them as the collection state.
+
+        tombstones holds new alive arrays from _mark_deleted; they replace the
+        segments' own only once the manifest is on disk, so a failed write
+        leaves the cached view matching the files.
+        """
+        alive = {segment.name: (tombstones or {}).get(segment.name, segment.alive) for segment in segments}
+        directory = self._dir(collection)
+        os.makedirs(directory, exist_ok=True)
+        manifest = {
+            "segments": [segment.name for segment in segments],
+            "deleted": {name: np.flatnonzero(~rows).tolist() for name, rows in alive.items() if not rows.all()},
+        }
+        tmp_path = os.path.join(directory, "manifest.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path(collection))
+        for segment in segments:
+            segment.alive = alive[segment.name]
+        self._collections.set(collection, (self._manifest_stamp(collection), segments))
+
+    def _write_segment(self, collection: str, matrix: np.ndarray, ids, documents, metadatas) -> _Segment:
+        directory = self._dir(collection)
+        os.makedirs(directory, exist_ok=True)
+        name = f"seg_{uuid.uuid4().hex}"
+        np.save(os.path.join(directory, f"{name}.npy"), matrix.astype(np.float32, copy=False))
+        with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+        return _Segment(directory, name)
+
+    def _mark_deleted(self, segments: List[_Segment], ids: Optional[set] = None,
+                      where: Optional[dict] = None) -> Dict[str, np.ndarray]:
+        """New alive arrays, by segment name, with live entries matching ids or a metadata
+        filter (equality and $in) tombstoned; the segments themselves are left untouched"""
+        tombstones = {}
+        for segment in segments:
+            alive = segment.alive
+            if ids:
+                rows = [segment.id_index[entry_id] for entry_id in ids if entry_id in segment.id_index]
+                if rows and alive[rows].any():
+                    alive = alive.copy()
+                    alive[rows] = False
+            if where:
+                mask = alive & segment.filter_mask(where)
+                if mask.any():
+                    alive = alive & ~mask
+            if alive is not segment.alive:
+                tombstones[segment.name] = alive
+        return tombstones
+
+    def add(self, collection, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        with self._write_lock(collection):
+            segments = list(self._load(collection))
+            # Re-adding an id replaces the earlier copy
+            tombstones = self._mark_deleted(segments, ids=set(ids))
+            segments.append(self._write_segment(
+                collection, np.asarray(embeddings, dtype=np.float32), ids, documents, metadatas
+            ))
+            self._save_manifest(collection, segments, tombstones)
+            if len(segments) > self.max_segments:
+                self._compact(collection)
+
+    def query(self, collection, embedding, n_results, where=None):
+        with self._lock:
+            segments = self._load(collection)
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(query @ query)
+        candidates = []
+        for segment in segments:
+            if not len(segment.ids):
+                continue
+            distances = segment.norms - 2 * (segment.matrix @ query) + query_norm
+            mask = segment.alive & segment.filter_mask(where) if where else segment.alive
+            distances = np.where(mask, distances, np.inf)
+            k = min(n_results, len(distances))
+            if k <= 0:
+                continue
+            top = np.argpartition(distances, k - 1)[:k]
+            candidates.extend(
+                (float(distances[i]), segment.documents[i], segment.metadatas[i])
+                for i in top if np.isfinite(distances[i])
+            )
+        candidates.sort(key=lambda match: match[0])
+        return candidates[:n_results]
+
+    def delete(self, collection, ids=None, where=None):
+        if not os.path.isdir(self._dir(collection)):
+            return
+        with self._write_lock(collection):
+            segments = self._load(collection)
+            tombstones = self._mark_deleted(segments, ids=set(ids or []), where=where)
+            if tombstones:
+                self._save_manifest(collection, segments, tombstones)
+
+    def count(self, collection):
+        with self._lock:
+            return int(sum(segment.alive.sum() for segment in self._load(collection)))
+
+    def compact(self, collection: str):
+        """Merge segments into one and drop deleted entries"""
+        with self._write_lock(collection):
+            self._compact(collection)
+
+    def _compact(self, collection: str):
+        old = self._load(collection)
+        matrices, ids, documents, metadatas = [], [], [], []
+        for segment in old:
+            keep = np.flatnonzero(segment.alive)
+            matrices.append(np.asarray(segment.matrix)[keep])
+            ids.extend(segment.ids[i] for i in keep)
+            documents.extend(segment.documents[i] for i in keep)
+            metadatas.extend(segment.metadatas[i] for i in keep)
+        segments = []
+        if ids:
+            segments.append(self._write_segment(collection, np.concatenate(matrices), ids, documents, metadatas))
+        self._save_manifest(collection, segments)
+        directory = self._dir(collection)
+        for segment in old:
+            for suffix in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(directory, segment.name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def delete_collection(self, collection):
+        with self._lock:
+            self._collections.pop(collection, None)
+            shutil.rmtree(self._dir(collection), ignore_errors=True)
+
+    def warm_up(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def cache_stats(self):
+        return self._collections.stats()
+
+
+def create_vector_store(backend: str, path: str) -> VectorStore:
+    """Build the configured VectorStore backend"""
+    if backend == "chroma":
+        return ChromaVectorStore(path)
+    if backend == "numpy":
+        return NumpyVectorStore(path)
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,72 @@
+"""Exercise the LLM dispatcher against the local fake provider.
+
+Fires a burst of batch calls with interactive calls arriving on top, once
+without admission control and once through the dispatcher, and reports
+latency, provider errors and fast rejections per class. Without the
+dispatcher interactive calls queue behind the whole batch burst.
+
+    python benchmarks/llm_dispatcher_benchmark.py --batch 60 --interactive 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["LLM_PROVIDER"] = "fake"
+
+from app.services import fake_llm
+from app.services import llm_service as llm_service_module
+from app.services.llm_dispatcher import LLMDispatcher, LLMOverloadedError, priority, BATCH, INTERACTIVE
+from app.services.llm_service import llm_service
+
+
+async def call(level: int, latencies: dict, outcomes: dict):
+    name = "interactive" if level == INTERACTIVE else "batch"
+    start = time.perf_counter()
+    with priority(level):
+        try:
+            response = await llm_service.generate_response_async("benchmark prompt")
+            outcome = "provider_error" if response.startswith("Error:") else "ok"
+        except LLMOverloadedError:
+            outcome = "rejected"
+    latencies[name].append((time.perf_counter() - start) * 1000)
+    outcomes[name][outcome] = outcomes[name].get(outcome, 0) + 1
+
+
+async def run(dispatcher: LLMDispatcher, batch: int, interactive: int) -> dict:
+    llm_service_module.llm_dispatcher = dispatcher
+    latencies = {"interactive": [], "batch": []}
+    outcomes = {"interactive": {}, "batch": {}}
+    tasks = [asyncio.create_task(call(BATCH, latencies, outcomes)) for _ in range(batch)]
+    await asyncio.sleep(0.05)
+    tasks += [asyncio.create_task(call(INTERACTIVE, latencies, outcomes)) for _ in range(interactive)]
+    await asyncio.gather(*tasks)
+    return {
+        name: {"p50_ms": round(statistics.median(values), 1), "max_ms": round(max(values), 1), **outcomes[name]}
+        for name, values in latencies.items() if values
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=60)
+    parser.add_argument("--interactive", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=fake_llm.FAKE_LLM_MAX_CONCURRENCY)
+    parser.add_argument("--queue-depth", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"fake provider: {fake_llm.FAKE_LLM_LATENCY_MS:.0f} ms/call, "
+          f"rate limited above {fake_llm.FAKE_LLM_MAX_CONCURRENCY} concurrent calls")
+    unlimited = LLMDispatcher(max_concurrency=10 ** 6, rate_per_sec=0, burst=1, max_queue_depth=10 ** 6)
+    print("no admission control:", asyncio.run(run(unlimited, args.batch, args.interactive)))
+    dispatcher = LLMDispatcher(max_concurrency=args.concurrency, rate_per_sec=0, burst=1,
+                               max_queue_depth=args.queue_depth)
+    print("dispatcher:          ", asyncio.run(run(dispatcher, args.batch, args.interactive)))
+    print(dispatcher.stats()["classes"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Benchmark PDF ingestion: whole-document vs the streaming ingestion pipeline.
+
+Generates a synthetic PDF (1,000 pages by default) and runs each mode in a
+fresh subprocess so peak RSS is measured independently. "pipeline" is
+process_document itself (chunking engine, header/footer stripping, dedupe,
+text store writer) on a scratch database and text store; "whole" does the
+same work with every page and chunk held in memory at once. A deterministic
+stand-in embedder keeps the run offline; pass --model to use a real
+SentenceTransformer instead.
+
+    python benchmarks/pdf_pipeline_benchmark.py --pages 1000 --strategy sentence
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+import numpy as np
+
+PARAGRAPH = (
+    "Workflow engine {page}.{n} routes user queries through retrieval, reasoning and output "
+    "stages. Stage {n} records timing data so operators can find bottlenecks. "
+)
+
+
+class StandInEmbedder:
+    """Deterministic hashing embedder with the EmbeddingService.add_documents signature"""
+
+    def __init__(self, dim: int = 384, model: str = None):
+        self.dim = dim
+        self.model = None
+        if model:
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(model)
+        self.stored = 0
+
+    def encode(self, texts):
+        if self.model is not None:
+            return self.model.encode(texts)
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+            vectors[row] = np.random.default_rng(seed).random(self.dim, dtype=np.float32)
+        return vectors
+
+    def add_documents(self, collection_name, documents, document_id, start_index=0):
+        self.encode(documents)
+        self.stored += len(documents)
+        return True
+
+    def delete_document(self, collection_name, document_id):
+        pass
+
+
+def build_pdf(path: str, pages: int):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        # A running footer, as real documents have, for the boilerplate stripping to find
+        body = "".join(PARAGRAPH.format(page=page_num + 1, n=n) for n in range(20))
+        text = f"Page {page_num + 1}\n" + body + "\nAcme Corp. Confidential"
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def run_whole(path: str, embedder: StandInEmbedder, strategy: str) -> int:
+    """Baseline: read every page, chunk the whole text, embed and store it in one go"""
+    from app.utils.chunking import ChunkStats, get_chunker, strip_repeated_lines
+    from app.utils.file_handler import iter_pdf_pages
+    from app.utils.text_store import text_store
+
+    pages = list(iter_pdf_pages(path))
+    stats = ChunkStats()
+    chunks = get_chunker(strategy).chunk("".join(strip_repeated_lines(pages, stats=stats)), stats)
+    embedder.add_documents("bench", chunks, "bench")
+    text_store.put(pages)
+    return len(chunks)
+
+
+def run_pipeline(path: str, embedder: StandInEmbedder, strategy: str) -> int:
+    """process_document: pages stream through the chunker into embedding batches and the text store"""
+    from app.models import Document, User
+    from app.services.ingestion_service import process_document
+    from app.utils.database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        document = Document(user_id=user.id, filename="synthetic.pdf", file_path=path, file_size=os.path.getsize(path))
+        db.add(document)
+        db.commit()
+        document_id = document.id
+    finally:
+        db.close()
+    return process_document(document_id, path, embedder, strategy)
+
+
+MODES = {"whole": run_whole, "pipeline": run_pipeline}
+
+
+def run_child(args):
+    # Scratch database and text store, set before app modules read them
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(args.workdir, args.mode + '.db')}"
+    os.environ["TEXT_STORE_PATH"] = os.path.join(args.workdir, args.mode + "_text")
+    os.environ["EMBEDDING_BATCH_SIZE"] = str(args.batch_size)
+    # Both modes load the same modules, so peak RSS differences come from the data
+    import app.services.ingestion_service  # noqa: F401
+    embedder = StandInEmbedder(model=args.model)
+    start = time.perf_counter()
+    chunks = MODES[args.mode](args.pdf, embedder, args.strategy)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "mode": args.mode,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--strategy", choices=["fixed", "sentence", "token"], default=None,
+                        help="chunking strategy (default: CHUNKING_STRATEGY)")
+    parser.add_argument("--model", default=None, help="SentenceTransformer model name (default: stand-in embedder)")
+    parser.add_argument("--mode", choices=list(MODES), help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "synthetic.pdf")
+        build_pdf(pdf_path, args.pages)
+        print(f"Synthetic PDF: {args.pages} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB")
+
+        for mode in MODES:
+            cmd = [sys.executable, __file__, "--mode", mode, "--pdf", pdf_path, "--workdir", tmp,
+                   "--batch-size", str(args.batch_size)]
+            if args.model:
+                cmd += ["--model", args.model]
+            if args.strategy:
+                cmd += ["--strategy", args.strategy]
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark moving document text out of the documents table.
+
+Builds two throwaway SQLite databases with the same documents, one holding
+the extracted text inline in text_content (the old layout) and one holding
+only a text_key into the content store, then reports database size and
+full-table scan time for each, compression ratio and write speed per codec,
+and the latency of reading one page versus the whole text.
+
+Text is synthetic unless --pdf points at a real PDF, whose pages are reused.
+
+    python benchmarks/text_store_benchmark.py --documents 200 --pages 40
+    python benchmarks/text_store_benchmark.py --pdf sample.pdf --documents 100
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, undefer
+
+from app.models import Document
+from app.models.base import Base
+from app.utils.text_store import TextStore, _zstandard
+
+WORDS = ("the of and to in is for on that with as by this be are from at or an it workflow document model "
+         "query answer retrieval embedding vector chunk page section table figure result method data system "
+         "performance latency throughput cache index storage compression request response user service").split()
+
+
+def synthetic_pages(pages: int, words_per_page: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(words_per_page)) + f"\n{rng.randint(0, 10 ** 6)}\n"
+        for _ in range(pages)
+    ]
+
+
+def build_table(path: str, documents: list, inline: bool, store: TextStore) -> tuple:
+    """Create a documents table with the text inline or in the store; returns (engine, seconds)"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    start = time.perf_counter()
+    db = Session()
+    for i, pages in enumerate(documents):
+        fields = {"text_content": "".join(pages)} if inline else {"text_key": store.put(pages), "text_pages": len(pages)}
+        db.add(Document(id=f"doc{i:06d}", user_id="bench", filename=f"doc{i}.pdf", file_path="-", file_size=0, **fields))
+    db.commit()
+    db.close()
+    return engine, time.perf_counter() - start
+
+
+def scan_ms(engine, inline: bool, repeats: int = 5) -> float:
+    """Load every document row, including the text when it is inline (as every ORM load did before)"""
+    Session = sessionmaker(bind=engine)
+    timings = []
+    for _ in range(repeats):
+        db = Session()
+        start = time.perf_counter()
+        query = db.query(Document)
+        if inline:
+            query = query.options(undefer(Document.text_content))
+        query.all()
+        timings.append((time.perf_counter() - start) * 1000)
+        db.close()
+    return round(statistics.median(timings), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--words-per-page", type=int, default=500)
+    parser.add_argument("--pdf", default=None)
+    args = parser.parse_args()
+
+    if args.pdf:
+        from app.utils.file_handler import iter_pdf_pages
+        source = list(iter_pdf_pages(args.pdf))
+        # Vary each copy slightly so content addressing doesn't collapse them into one blob
+        documents = [source[:-1] + [source[-1] + f"\n{i}"] for i in range(args.documents)]
+    else:
+        documents = [synthetic_pages(args.pages, args.words_per_page, seed=i) for i in range(args.documents)]
+    raw_bytes = sum(len(page.encode("utf-8")) for pages in documents for page in pages)
+    print(f"{len(documents)} documents, {raw_bytes / 1e6:.1f} MB of text")
+
+    codecs = ["gzip"] + (["zstd"] if _zstandard() is not None else [])
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in codecs:
+            store = TextStore(os.path.join(tmp, f"store_{codec}"), codec)
+            start = time.perf_counter()
+            keys = [store.put(pages) for pages in documents]
+            seconds = time.perf_counter() - start
+            stored = sum(os.path.getsize(store._blob_path(key)) for key in set(keys))
+            one_page, whole = [], []
+            for key in keys[:50]:
+                start = time.perf_counter()
+                store.read_pages(key, len(documents[0]) // 2, len(documents[0]) // 2 + 1)
+                one_page.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                store.read_text(key)
+                whole.append((time.perf_counter() - start) * 1000)
+            print(f"{codec}: ratio {raw_bytes / stored:.2f}x, write {raw_bytes / 1e6 / seconds:.1f} MB/s, "
+                  f"read one page {statistics.median(one_page):.3f} ms vs whole text {statistics.median(whole):.3f} ms")
+
+        store = TextStore(os.path.join(tmp, "store"))
+        for inline in (True, False):
+            path = os.path.join(tmp, f"{'inline' if inline else 'store'}.db")
+            engine, seconds = build_table(path, documents, inline, store)
+            label = "inline text_content" if inline else f"text_key ({store.codec} store)"
+            print(f"{label}: database {os.path.getsize(path) / 1e6:.2f} MB, "
+                  f"insert {seconds:.2f} s, full scan {scan_ms(engine, inline)} ms")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark VectorStore backends: Chroma vs memory-mapped NumPy.
+
+Loads random float32 vectors into a fresh store per backend and reports
+add time, cold start (open + first query) and query latency percentiles,
+with and without a source filter. Chroma is skipped if not installed.
+
+    python benchmarks/vector_store_benchmark.py --vectors 5000 --dim 384
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.utils.vector_store import create_vector_store
+
+COLLECTION = "bench"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def run_backend(backend: str, vectors: np.ndarray, queries: np.ndarray, top_k: int, batch: int, sources: int) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        store = create_vector_store(backend, path)
+        store.warm_up()
+        ids = [f"doc{i % sources}_chunk_{i}" for i in range(len(vectors))]
+
+        start = time.perf_counter()
+        for i in range(0, len(vectors), batch):
+            store.add(
+                COLLECTION,
+                ids=ids[i:i + batch],
+                embeddings=vectors[i:i + batch].tolist(),
+                documents=[f"chunk {j}" for j in range(i, min(i + batch, len(vectors)))],
+                metadatas=[{"source": f"doc{j % sources}"} for j in range(i, min(i + batch, len(vectors)))]
+            )
+        add_seconds = time.perf_counter() - start
+
+        # Cold start: a new store instance over the same files
+        start = time.perf_counter()
+        store = create_vector_store(backend, path)
+        store.warm_up()
+        store.query(COLLECTION, queries[0].tolist(), top_k)
+        cold_start_ms = (time.perf_counter() - start) * 1000
+
+        results = {"backend": backend, "add_s": round(add_seconds, 3), "cold_start_ms": round(cold_start_ms, 1)}
+        filters = {"unfiltered": None, "filtered": {"source": {"$in": [f"doc{i}" for i in range(max(sources // 4, 2))]}}}
+        for label, where in filters.items():
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                store.query(COLLECTION, query.tolist(), top_k, where=where)
+                latencies.append((time.perf_counter() - start) * 1000)
+            results[f"{label}_p50_ms"] = round(statistics.median(latencies), 3)
+            results[f"{label}_p95_ms"] = round(percentile(latencies, 95), 3)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--sources", type=int, default=20, help="Distinct source documents in the collection")
+    parser.add_argument("--backends", default="numpy,chroma")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, top-{args.top_k}")
+    for backend in args.backends.split(","):
+        if backend == "chroma":
+            try:
+                import chromadb  # noqa: F401
+            except ImportError:
+                print("chroma: chromadb not installed, skipping")
+                continue
+        print(run_backend(backend, vectors, queries, args.top_k, args.batch, args.sources))
+
+
+if __name__ == "__main__":
+    main()
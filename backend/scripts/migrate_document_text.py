@@ -0,0 +1,105 @@
+"""Move extracted text from documents.text_content into the content store.
+
+Adds the text_key / text_pages columns if the table predates them, then for
+each document still holding inline text: splits it back into pages when the
+original PDF is still on disk (so page range reads work), writes it to the
+content store (TEXT_STORE_PATH), points the row at it and clears the column.
+Pass --vacuum to give the freed space back (VACUUM on SQLite, VACUUM FULL
+on Postgres, which locks the table while it runs).
+
+    python scripts/migrate_document_text.py [--dry-run] [--batch-size 100] [--vacuum]
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, inspect, text
+
+from app.models import Document
+from app.utils.database import SessionLocal, engine
+from app.utils.file_handler import iter_pdf_pages
+from app.utils.text_store import text_store
+
+NEW_COLUMNS = {"text_key": "VARCHAR", "text_pages": "INTEGER DEFAULT 0"}
+
+
+def ensure_columns(dry_run: bool):
+    existing = {column["name"] for column in inspect(engine).get_columns("documents")}
+    for name, ddl in NEW_COLUMNS.items():
+        if name not in existing:
+            print(f"Adding documents.{name}")
+            if not dry_run:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE documents ADD COLUMN {name} {ddl}"))
+
+
+def split_pages(text_content: str, file_path: str) -> List[str]:
+    """Recover page boundaries from the source PDF if it still matches the stored text"""
+    try:
+        pages = list(iter_pdf_pages(file_path))
+    except Exception:
+        return [text_content]
+    return pages if "".join(pages) == text_content else [text_content]
+
+
+def inline_bytes(db) -> int:
+    return db.query(func.coalesce(func.sum(func.length(Document.text_content)), 0)).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args()
+
+    ensure_columns(args.dry_run)
+    if args.dry_run and set(NEW_COLUMNS) - {c["name"] for c in inspect(engine).get_columns("documents")}:
+        print("Dry run stops here: the new columns are needed to look up unmigrated documents")
+        return
+
+    db = SessionLocal()
+    try:
+        print(f"Inline text before: {inline_bytes(db)} characters")
+        moved = paged = 0
+        last_id = ""
+        while True:
+            # Walk by id so a dry run (which changes nothing) still terminates
+            rows = db.query(Document.id, Document.file_path, Document.text_content).filter(
+                Document.text_content.isnot(None),
+                Document.text_key.is_(None),
+                Document.id > last_id
+            ).order_by(Document.id).limit(args.batch_size).all()
+            if not rows:
+                break
+            for doc_id, file_path, text_content in rows:
+                pages = split_pages(text_content, file_path)
+                paged += len(pages) > 1
+                if not args.dry_run:
+                    db.query(Document).filter(Document.id == doc_id).update({
+                        "text_key": text_store.put(pages),
+                        "text_pages": len(pages),
+                        "text_content": None,
+                    })
+                moved += 1
+                last_id = doc_id
+            if not args.dry_run:
+                db.commit()
+            print(f"  {moved} documents moved")
+        print(f"{'Would move' if args.dry_run else 'Moved'} {moved} documents "
+              f"({paged} split into pages from their PDFs)")
+        print(f"Inline text after: {inline_bytes(db)} characters")
+    finally:
+        db.close()
+
+    if args.vacuum and not args.dry_run:
+        print("Reclaiming space...")
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM" if engine.dialect.name == "sqlite" else "VACUUM FULL documents"))
+
+
+if __name__ == "__main__":
+    main()
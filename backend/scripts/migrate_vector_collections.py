@@ -0,0 +1,94 @@
+"""Move per-document Chroma collections into per-user collections.
+
+Documents ingested before chunks were stored per user live in their own
+`doc_<document id>` collection. This copies their chunks (with the stored
+embeddings, so nothing is re-encoded) into `user_<user id>` tagged with
+`source` metadata in the configured vector store (VECTOR_STORE),
+repoints Document.embedding_id and drops the old collection.
+
+    python scripts/migrate_vector_collections.py [--dry-run] [--keep-legacy]
+"""
+import argparse
+import os
+import sys
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Document
+from app.utils.database import SessionLocal
+from app.utils.embeddings import embedding_service, user_collection_name, CHROMA_PATH
+from app.utils.vector_store import ChromaVectorStore
+
+PAGE_SIZE = 500
+
+
+def migrate_document(chroma: ChromaVectorStore, document: Document, dry_run: bool) -> Optional[int]:
+    """Copy one legacy collection into its owner's collection; returns chunks moved"""
+    try:
+        legacy = chroma.client.get_collection(document.embedding_id)
+    except Exception:
+        print(f"  {document.id}: collection {document.embedding_id} missing, skipping")
+        return None
+
+    target_name = user_collection_name(document.user_id)
+
+    moved = 0
+    offset = 0
+    while True:
+        page = legacy.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=PAGE_SIZE,
+            offset=offset
+        )
+        if not page["ids"]:
+            break
+        if not dry_run:
+            embedding_service.vector_store.add(
+                target_name,
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=[{**(meta or {}), "source": document.id} for meta in page["metadatas"]]
+            )
+        moved += len(page["ids"])
+        offset += PAGE_SIZE
+
+    if not dry_run:
+        document.embedding_id = target_name
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without writing")
+    parser.add_argument("--keep-legacy", action="store_true", help="Leave the old collections in place")
+    args = parser.parse_args()
+
+    # Legacy collections always live in Chroma, whichever store is configured
+    chroma = ChromaVectorStore(CHROMA_PATH)
+    db = SessionLocal()
+    try:
+        documents = db.query(Document).filter(Document.embedding_id.like("doc\\_%", escape="\\")).all()
+        print(f"{len(documents)} documents use per-document collections")
+        total = 0
+        for document in documents:
+            legacy_name = document.embedding_id
+            moved = migrate_document(chroma, document, args.dry_run)
+            if moved is None:
+                continue
+            print(f"  {document.id}: {moved} chunks -> {user_collection_name(document.user_id)}")
+            total += moved
+            if not args.dry_run:
+                # Commit per document so an interrupted run can be resumed, and
+                # only drop the old collection once the row points elsewhere
+                db.commit()
+                if not args.keep_legacy:
+                    chroma.delete_collection(legacy_name)
+        print(f"{'Would move' if args.dry_run else 'Moved'} {total} chunks")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Local stand-in for SerpAPI's /search endpoint, for running web search offline.
+
+Answers every query with canned organic results derived from the query text,
+optionally after a delay to exercise timeouts. Point the backend at it with
+any non-empty key:
+
+    python scripts/serpapi_stub.py --port 8099 --delay-ms 200
+    SERPAPI_BASE_URL=http://127.0.0.1:8099 SERPAPI_API_KEY=stub python app/main.py
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_handler(delay_ms: float):
+    class SearchHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+        requests_served = 0
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/search":
+                self.send_error(404)
+                return
+            params = parse_qs(url.query)
+            query = params.get("q", [""])[0]
+            num = int(params.get("num", ["5"])[0])
+            if delay_ms:
+                time.sleep(delay_ms / 1000)
+            SearchHandler.requests_served += 1
+
+            body = json.dumps({
+                "search_parameters": {"q": query, "num": num},
+                "organic_results": [
+                    {
+                        "position": i + 1,
+                        "title": f"Result {i + 1} for {query}",
+                        "link": f"https://example.com/{i + 1}",
+                        "snippet": f"Stub snippet {i + 1} about {query}.",
+                    }
+                    for i in range(num)
+                ],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SearchHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--delay-ms", type=float, default=0, help="Latency added to every response")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay_ms))
+    print(f"SerpAPI stub listening on http://{args.host}:{args.port}/search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
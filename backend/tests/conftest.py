@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Run from the backend directory or the repo root alike
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests that touch the database get a scratch one, set before app modules read it
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_PROVIDER", "fake")
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.models import ChatMessage
+from app.routes import workflows
+from app.schemas_workflow import WorkflowExecutionRequest
+from app.utils.database import AsyncSessionLocal, async_engine, init_db
+
+
+def test_disconnect_mid_batch_keeps_finished_answers(monkeypatch):
+    init_db()
+    finished, cancelled, closed = [], [], []
+
+    async def execute_cached(workflow, graph, request, targets):
+        if request.query.startswith("slow"):
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(request.query)
+                raise
+        finished.append(request.query)
+        return f"answer to {request.query}", {"total_ms": 1.0}, "miss"
+
+    async def embed_queries(queries):
+        raise RuntimeError("embedding backend unavailable")
+
+    def session_factory():
+        session = AsyncSessionLocal()
+        close = session.close
+
+        async def tracked_close():
+            closed.append(session)
+            await close()
+
+        session.close = tracked_close
+        return session
+
+    monkeypatch.setattr(workflows, "_execute_cached", execute_cached)
+    monkeypatch.setattr(workflows.embedding_service, "embed_queries_async", embed_queries)
+    monkeypatch.setattr(workflows, "AsyncSessionLocal", session_factory)
+
+    workflow = SimpleNamespace(id="wf-disconnect")
+    queries = ["fast 1", "fast 2", "fast 3", "slow 1"]
+    items = [WorkflowExecutionRequest(query=query) for query in queries]
+
+    async def main():
+        first_line = asyncio.Event()
+        sent = []
+
+        async def send(message):
+            if message.get("body"):
+                sent.append(message["body"])
+                first_line.set()
+
+        async def receive():
+            # The client hangs up once the first result has been streamed
+            await first_line.wait()
+            await asyncio.sleep(0.05)
+            return {"type": "http.disconnect"}
+
+        response = StreamingResponse(
+            workflows._batch_results(workflow, None, items, {(): {}}, "user-1", 4),
+            media_type="application/x-ndjson"
+        )
+        # ASGI 2.0 servers report the disconnect by cancelling the stream
+        await response({"type": "http", "asgi": {"spec_version": "2.0"}}, receive, send)
+        async with AsyncSessionLocal() as db:
+            stored = (await db.execute(
+                select(ChatMessage.query).where(ChatMessage.workflow_id == workflow.id)
+            )).scalars().all()
+        await async_engine.dispose()
+        return sent, stored
+
+    sent, stored = asyncio.run(main())
+    assert len(sent) < len(queries)
+    assert cancelled == ["slow 1"]
+    assert sorted(stored) == sorted(finished) == ["fast 1", "fast 2", "fast 3"]
+    assert len(closed) == 1
@@ -0,0 +1,27 @@
+from app.utils.chunking import ChunkStats, SentenceChunker, strip_repeated_lines
+
+
+def test_chunks_differing_only_by_a_number_are_kept():
+    chunker = SentenceChunker(chunk_size=40, overlap=0)
+    stats = ChunkStats()
+    chunks = chunker.chunk("Invoice total is 120 dollars.\n\nInvoice total is 450 dollars.\n\n", stats)
+    assert chunks == ["Invoice total is 120 dollars.", "Invoice total is 450 dollars."]
+    assert stats.duplicates_dropped == 0
+
+
+def test_exact_duplicate_chunks_are_dropped():
+    chunker = SentenceChunker(chunk_size=40, overlap=0)
+    stats = ChunkStats()
+    chunks = chunker.chunk("Invoice total is 120 dollars.\n\nInvoice  total is 120 dollars.\n\n", stats)
+    assert chunks == ["Invoice total is 120 dollars."]
+    assert stats.duplicates_dropped == 1
+
+
+def test_page_numbered_footers_still_count_as_repeats():
+    words = ["alpha", "bravo", "charlie", "delta", "echo"]
+    pages = [f"Section {w}\nBody about {w}\nMore on {w}\nCompany report - page {i}\n"
+             for i, w in enumerate(words, start=1)]
+    stats = ChunkStats()
+    kept = list(strip_repeated_lines(pages, min_repeats=3, stats=stats))
+    assert "page 4" not in kept[3] and "page 5" not in kept[4]
+    assert stats.boilerplate_lines_dropped == 2
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import workflows
+from app.schemas_workflow import WorkflowExecutionRequest
+from app.services import fake_llm
+from app.services.llm_dispatcher import BATCH, INTERACTIVE, STANDARD, LLMDispatcher, LLMOverloadedError, llm_dispatcher
+from app.services.llm_service import llm_service
+from app.utils.database import async_engine, init_db
+
+
+def test_interactive_calls_are_served_before_batch_calls():
+    dispatcher = LLMDispatcher(max_concurrency=1, rate_per_sec=0)
+    order = []
+
+    async def call(level, name):
+        async with dispatcher.slot(level):
+            order.append(name)
+
+    async def main():
+        # Hold the only slot while calls of every class queue up
+        await dispatcher.acquire(BATCH)
+        tasks = [asyncio.create_task(call(level, name)) for level, name in
+                 [(BATCH, "batch 1"), (STANDARD, "standard"), (BATCH, "batch 2"), (INTERACTIVE, "interactive")]]
+        await asyncio.sleep(0.01)
+        dispatcher.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["interactive", "standard", "batch 1", "batch 2"]
+
+
+def test_token_bucket_limits_the_call_rate():
+    dispatcher = LLMDispatcher(max_concurrency=10, rate_per_sec=20, burst=1)
+
+    async def call():
+        async with dispatcher.slot(STANDARD):
+            pass
+
+    async def main():
+        started = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(11)))
+        return time.monotonic() - started
+
+    # One call on the burst token, then ten more at 20 per second
+    assert asyncio.run(main()) >= 0.45
+
+
+def test_in_flight_calls_never_exceed_max_concurrency(monkeypatch):
+    monkeypatch.setattr(fake_llm, "FAKE_LLM_LATENCY_MS", 20)
+    monkeypatch.setattr(fake_llm, "stats", {"calls": 0, "rate_limited": 0, "max_active": 0})
+    dispatcher = LLMDispatcher(max_concurrency=3, rate_per_sec=0)
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.run(llm_service.generate_response, f"q{i}") for i in range(20)))
+
+    try:
+        responses = asyncio.run(main())
+    finally:
+        dispatcher.executor.shutdown()
+    assert all(response.startswith("[fake]") for response in responses)
+    assert fake_llm.stats["calls"] == 20
+    assert fake_llm.stats["max_active"] == 3
+    assert fake_llm.stats["rate_limited"] == 0
+
+
+def test_deep_queue_is_rejected_with_429_and_retry_after(monkeypatch):
+    monkeypatch.setattr(llm_dispatcher, "max_queue_depth", 0)
+    response = TestClient(app).post("/api/chat/", json={"message": "hello"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_batch_queries_back_off_and_retry_when_overloaded(monkeypatch):
+    init_db()
+    attempts = []
+
+    async def execute_cached(workflow, graph, request, targets):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise LLMOverloadedError(retry_after=1)
+        return "answer", {"total_ms": 1.0}, "miss"
+
+    async def embed_queries(queries):
+        return len(queries)
+
+    monkeypatch.setattr(workflows, "_execute_cached", execute_cached)
+    monkeypatch.setattr(workflows.embedding_service, "embed_queries_async", embed_queries)
+    items = [WorkflowExecutionRequest(query="retry me")]
+
+    async def main():
+        lines = [line async for line in workflows._batch_results(
+            SimpleNamespace(id="wf-retry"), None, items, {(): {}}, "user-1", 1
+        )]
+        await async_engine.dispose()
+        return lines
+
+    lines = asyncio.run(main())
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 1
+    assert '"succeeded": 1' in lines[-1]
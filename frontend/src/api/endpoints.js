@@ -15,7 +15,7 @@ export const workflowsAPI = {
   update: (id, data) => apiClient.put(`/api/workflows/${id}`, data),
   delete: (id) => apiClient.delete(`/api/workflows/${id}`),
   execute: (id, data) => apiClient.post(`/api/workflows/${id}/execute`, data),
-  getChatHistory: (id) => apiClient.get(`/api/workflows/${id}/chat-history`),
+  getChatHistory: (id, params) => apiClient.get(`/api/workflows/${id}/chat-history`, { params }),
 };
 
 // Documents API
@@ -28,6 +28,7 @@ export const documentsAPI = {
   list: () => apiClient.get('/api/documents'),
   get: (id) => apiClient.get(`/api/documents/${id}`),
   delete: (id) => apiClient.delete(`/api/documents/${id}`),
+  getJob: (jobId) => apiClient.get(`/api/documents/jobs/${jobId}`),
 };
 
 // Chat API